@@ -0,0 +1,231 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Budget tiers, from UsageLedger.tier
+FULL = 'full'
+ECONOMY = 'economy'
+OVER_BUDGET = 'over_budget'
+
+_UPSERT_USAGE = (
+    "INSERT INTO token_usage (day, guild_id, user_id, command, prompt_tokens, completion_tokens) "
+    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (day, guild_id, user_id, command) DO UPDATE SET "
+    "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+    "completion_tokens = completion_tokens + excluded.completion_tokens"
+)
+
+
+def _today():
+    return time.strftime('%Y-%m-%d', time.gmtime())
+
+
+class UsageLedger:
+    """
+    AI tokens used per guild, user and command, per UTC day, with daily guild quotas
+
+    Recording a provider's usage report only adds to in-memory counters;
+    a background task writes them out every ``flush_interval`` seconds in
+    one transaction on a worker thread, the same way as the stats store.
+    Each guild's total for the day is kept in memory too (recomputed at start),
+    so checking a quota is a dict lookup. DMs are counted under guild 0.
+
+    A guild past its daily quota is moved to the providers' economy model;
+    past its hard limit, or past the quota when no economy model is set
+    up, it gets fallback replies until the day turns over.
+    """
+
+    def __init__(self, path, flush_interval=30.0, daily_tokens=None, max_daily_tokens=None, quotas=None):
+        """
+        Args:
+            path: SQLite file for the ledger
+            flush_interval: Seconds between batched writes
+            daily_tokens: Tokens a guild may use per day on the normal model
+                (None = no quota)
+            max_daily_tokens: Tokens per day after which even the economy
+                model is off (None = no hard limit)
+            quotas: Guild id -> (daily_tokens, max_daily_tokens) overriding
+                the defaults
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.daily_tokens = daily_tokens
+        self.max_daily_tokens = max_daily_tokens
+        self.quotas = quotas or {}
+        self.day = _today()
+        # guild_id -> tokens used today (flushed or not)
+        self.guild_tokens = {}
+        # (day, guild_id, user_id, command) -> [prompt tokens, completion tokens]
+        self.pending = {}
+        self.db = None
+        self.write_lock = threading.Lock()
+        self.flush_lock = asyncio.Lock()
+        self.task = None
+
+    def _roll_over(self):
+        today = _today()
+        if today != self.day:
+            self.day = today
+            self.guild_tokens = {}
+
+    def record(self, origin, prompt_tokens, completion_tokens):
+        """
+        Add one call's usage for the command behind ``origin`` (no I/O)
+
+        Background work (no origin) is logged under guild and user 0 and
+        command ``-`` but counts against no guild's quota.
+        """
+        self._roll_over()
+        guild_id = (origin.guild_id or 0) if origin else 0
+        user_id, command = (origin.user_id or 0, origin.command or '-') if origin else (0, '-')
+        key = (self.day, guild_id, user_id, command)
+        counts = self.pending.get(key)
+        if counts is None:
+            counts = self.pending[key] = [0, 0]
+        counts[0] += prompt_tokens
+        counts[1] += completion_tokens
+        if origin:
+            self.guild_tokens[guild_id] = self.guild_tokens.get(guild_id, 0) + prompt_tokens + completion_tokens
+
+    def quota(self, guild_id):
+        """(daily tokens, hard limit) for a guild; either may be None"""
+        return self.quotas.get(guild_id or 0, (self.daily_tokens, self.max_daily_tokens))
+
+    def used_today(self, guild_id):
+        self._roll_over()
+        return self.guild_tokens.get(guild_id or 0, 0)
+
+    def tier(self, guild_id, economy_available=True):
+        """:data:`FULL`, :data:`ECONOMY` or :data:`OVER_BUDGET` for the guild's next AI call"""
+        soft, hard = self.quota(guild_id)
+        if soft is None and hard is None:
+            return FULL
+        used = self.used_today(guild_id)
+        if hard is not None and used >= hard:
+            return OVER_BUDGET
+        if soft is None or used < soft:
+            return FULL
+        return ECONOMY if economy_available else OVER_BUDGET
+
+    def start(self):
+        """Open the database, load today's guild totals and start the write-behind task"""
+        if self.task is not None:
+            return
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS token_usage (day TEXT NOT NULL, guild_id INTEGER NOT NULL, "
+            "user_id INTEGER NOT NULL, command TEXT NOT NULL, prompt_tokens INTEGER NOT NULL, "
+            "completion_tokens INTEGER NOT NULL, PRIMARY KEY (day, guild_id, user_id, command)) WITHOUT ROWID"
+        )
+        self.db.commit()
+        self._roll_over()
+        for guild_id, tokens in self.db.execute(
+            "SELECT guild_id, SUM(prompt_tokens + completion_tokens) FROM token_usage "
+            "WHERE day = ? AND NOT (user_id = 0 AND command = '-') GROUP BY guild_id",
+            (self.day,)
+        ):
+            self.guild_tokens[guild_id] = self.guild_tokens.get(guild_id, 0) + tokens
+        self.task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Usage ledger opened at {self.path} ({len(self.guild_tokens)} guilds have used AI today)")
+
+    async def stop(self):
+        """Write out everything pending and close the database"""
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        await self.flush()
+        with self.write_lock:
+            self.db.close()
+        self.db = None
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Usage ledger flush failed, will retry: {e}")
+
+    async def flush(self):
+        """Add pending usage to the database"""
+        if self.db is None or not self.pending:
+            return
+        async with self.flush_lock:
+            batch, self.pending = self.pending, {}
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception:
+                # Rolled back: merge the batch into whatever was recorded meanwhile
+                for key, (prompt_tokens, completion_tokens) in batch.items():
+                    counts = self.pending.setdefault(key, [0, 0])
+                    counts[0] += prompt_tokens
+                    counts[1] += completion_tokens
+                raise
+
+    def _write(self, batch):
+        with self.write_lock, self.db:
+            self.db.executemany(_UPSERT_USAGE, [(*key, *counts) for key, counts in batch.items()])
+
+    def stats(self, economy_available=True):
+        """
+        Today's token total and how many guilds are on the economy model or out of budget
+
+        ``economy_available`` must match what the request path passes to
+        :meth:`tier`, or guilds refused for lack of an economy model count as economy.
+        """
+        self._roll_over()
+        tiers = [self.tier(guild_id, economy_available) for guild_id in self.guild_tokens]
+        return {
+            'day': self.day,
+            'tokens': sum(self.guild_tokens.values()),
+            'guilds': len(self.guild_tokens),
+            'economy': tiers.count(ECONOMY),
+            'over_budget': tiers.count(OVER_BUDGET)
+        }
+
+
+def _tokens(value):
+    """Env token count; empty or 0 means no limit (None)"""
+    return int(value) if value and int(value) > 0 else None
+
+
+def parse_quotas(value):
+    """
+    AI_GUILD_QUOTAS JSON -> {guild_id: (daily tokens, hard limit)}
+
+    Each value is a daily token count or a ``[daily, hard]`` pair (0 = none).
+    """
+    try:
+        spec = json.loads(value or '{}')
+    except ValueError:
+        logger.error("AI_GUILD_QUOTAS is not valid JSON - ignoring it")
+        return {}
+    quotas = {}
+    for guild_id, quota in spec.items():
+        soft, hard = quota if isinstance(quota, list) else (quota, 0)
+        quotas[int(guild_id)] = (_tokens(str(soft)), _tokens(str(hard)))
+    return quotas
+
+
+# Shared ledger. Usage is kept in USAGE_DB_PATH (the stats database by default).
+# AI_GUILD_DAILY_TOKENS moves a guild to the economy model for the rest of the UTC
+# day; AI_GUILD_DAILY_MAX_TOKENS switches it to fallbacks; AI_GUILD_QUOTAS overrides both per guild.
+usage_ledger = UsageLedger(
+    os.getenv('USAGE_DB_PATH', os.getenv('STATS_DB_PATH', 'stats.db')),
+    flush_interval=float(os.getenv('USAGE_FLUSH_INTERVAL', '30')),
+    daily_tokens=_tokens(os.getenv('AI_GUILD_DAILY_TOKENS')),
+    max_daily_tokens=_tokens(os.getenv('AI_GUILD_DAILY_MAX_TOKENS')),
+    quotas=parse_quotas(os.getenv('AI_GUILD_QUOTAS'))
+)
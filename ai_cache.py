@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry TTL and a memory cap"""
+
+    def __init__(self, max_entries=1000, max_bytes=2_000_000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size_bytes = 0
+
+    async def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.time():
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value, ttl):
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.time() + ttl, value)
+        self.size_bytes += len(key) + len(value.encode('utf-8'))
+        while self.entries and (len(self.entries) > self.max_entries or self.size_bytes > self.max_bytes):
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        expires, value = self.entries.pop(key)
+        self.size_bytes -= len(key) + len(value.encode('utf-8'))
+
+    def close(self):
+        self.entries.clear()
+        self.size_bytes = 0
+
+
+class SQLiteCacheBackend:
+    """
+    On-disk LRU cache so responses survive restarts
+
+    SQLite calls run in a worker thread to keep disk I/O off the event loop.
+    """
+
+    def __init__(self, path, max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS ai_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS ai_cache_last_used ON ai_cache (last_used)")
+        self.db.commit()
+
+    async def get(self, key):
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key, value, ttl):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    def _get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT value, expires FROM ai_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self.db.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+                self.db.commit()
+                return None
+            self.db.execute("UPDATE ai_cache SET last_used = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            return row[0]
+
+    def _set(self, key, value, ttl):
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO ai_cache (key, value, expires, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            self.db.execute("DELETE FROM ai_cache WHERE expires < ?", (now,))
+            self.db.execute(
+                "DELETE FROM ai_cache WHERE key IN ("
+                "SELECT key FROM ai_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class ResponseCache:
+    """
+    Reuse AI responses for identical prompts within a per-command TTL
+
+    Only commands listed in ``policy`` (command name -> TTL seconds) are
+    cached, so roasts that should stay fresh every time are never reused.
+    """
+
+    def __init__(self, backend, policy):
+        self.backend = backend
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+
+    def allows(self, command):
+        """Whether responses for ``command`` may be reused"""
+        return self.policy.get(command, 0) > 0
+
+    @staticmethod
+    def make_key(command, *params):
+        """Stable fingerprint of the command and everything that shapes its prompt"""
+        raw = json.dumps([command, *params], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    async def get(self, key):
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key, value, command):
+        try:
+            await self.backend.set(key, value, self.policy[command])
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    def close(self):
+        self.backend.close()
+
+
+def parse_policy(value, defaults):
+    """
+    ``"command=ttl,..."`` on top of ``defaults`` -> cache policy (command name -> TTL seconds)
+
+    A TTL of ``0`` stops a default command from being cached.
+    """
+    policy = dict(defaults)
+    for entry in (value or '').split(','):
+        command, _, ttl = entry.partition('=')
+        if command.strip():
+            policy[command.strip()] = float(ttl or 0)
+    return policy
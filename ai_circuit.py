@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from ai_transport import AITransportError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling the provider while the circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Stop calling the AI provider while it is failing
+
+    Counts consecutive failures and opens after ``failure_threshold`` of
+    them, so commands go straight to their fallbacks. After ``cooldown``
+    seconds one probe request is let through (half-open). If it succeeds the
+    circuit closes again; if not it stays open for another cooldown.
+
+    Also tracks recent latencies so the timeout follows the provider's p95
+    instead of a fixed value.
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=30.0, min_timeout=3.0, max_timeout=10.0,
+                 timeout_factor=1.5, min_samples=10, sample_size=100):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_factor = timeout_factor
+        self.min_samples = min_samples
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.rejected = 0
+        self.latencies = deque(maxlen=sample_size)
+        self.outcomes = deque(maxlen=sample_size)
+
+    @property
+    def is_open(self):
+        """Whether calls are currently being refused (without using up the probe)"""
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at < self.cooldown
+        return self.state == HALF_OPEN and self.probing
+
+    def timeout(self):
+        """Per-call timeout derived from the recent p95 latency"""
+        if len(self.latencies) < self.min_samples:
+            return self.max_timeout
+        adaptive = self.latency_percentile(0.95) * self.timeout_factor
+        return min(self.max_timeout, max(self.min_timeout, adaptive))
+
+    def latency_percentile(self, fraction):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def before_call(self):
+        """
+        Claim permission to call the provider
+
+        Raises:
+            CircuitOpen: While open, or while the half-open probe is running
+        """
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                self.rejected += 1
+                raise CircuitOpen("AI provider circuit is open")
+            self.state = HALF_OPEN
+            logger.info("AI circuit half-open, probing provider")
+        if self.state == HALF_OPEN:
+            if self.probing:
+                self.rejected += 1
+                raise CircuitOpen("AI provider circuit is half-open")
+            self.probing = True
+
+    def record_success(self, latency):
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.failures = 0
+        self.probing = False
+        if self.state != CLOSED:
+            logger.info(f"AI circuit closed after a {latency:.2f}s probe")
+            self.state = CLOSED
+
+    def record_failure(self):
+        self.outcomes.append(False)
+        self.failures += 1
+        self.probing = False
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            logger.warning(f"AI circuit opened after {self.failures} consecutive failures")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def record_cancel(self):
+        """Release a half-open probe that was abandoned without an outcome"""
+        self.probing = False
+
+    async def call(self, factory):
+        """
+        Call the provider through the breaker
+
+        Args:
+            factory: Callable taking the timeout in seconds and returning the awaitable to run
+
+        Raises:
+            CircuitOpen: When the call is refused
+        """
+        self.before_call()
+        start = time.monotonic()
+        try:
+            result = await factory(self.timeout())
+        except asyncio.CancelledError:
+            self.record_cancel()
+            raise
+        except Exception as e:
+            if is_provider_failure(e):
+                self.record_failure()
+            else:
+                self.record_cancel()
+            raise
+        self.record_success(time.monotonic() - start)
+        return result
+
+    def stats(self):
+        """Breaker state, recent error rate and latency percentiles"""
+        errors = self.outcomes.count(False)
+        return {
+            'state': self.state,
+            'rejected': self.rejected,
+            'error_rate': errors / len(self.outcomes) if self.outcomes else 0.0,
+            'latency_p50': self.latency_percentile(0.5),
+            'latency_p95': self.latency_percentile(0.95),
+            'timeout': self.timeout()
+        }
+
+
+def is_provider_failure(error):
+    """Whether an error says the provider is unhealthy (rather than our request being bad)"""
+    if isinstance(error, AITransportError) and error.status is not None:
+        return error.status >= 500 or error.status == 429
+    return True
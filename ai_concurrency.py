@@ -0,0 +1,101 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def gather_with_deadline(coros, deadline, fallbacks):
+    """
+    Run several AI generations at once and fill in any slot that misses the deadline
+
+    Args:
+        coros: Awaitables to run concurrently (one per slot)
+        deadline: Seconds to wait for the whole batch
+        fallbacks: One zero-argument callable per slot, used when that slot
+            times out, raises or returns an empty result
+
+    Returns:
+        List of results in the same order as ``coros``
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(f"{len(pending)} of {len(tasks)} AI generations missed the {deadline}s deadline")
+
+    results = []
+    for task, fallback in zip(tasks, fallbacks):
+        result = None
+        if task in done and not task.cancelled():
+            if task.exception() is not None:
+                logger.warning(f"AI generation failed: {task.exception()}")
+            else:
+                result = task.result()
+        results.append(result if result else fallback())
+    return results
+
+
+class _Flight:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight AI requests
+
+    The first caller for a key starts the request; anyone asking for the same
+    key while it is still running awaits the same result instead of sending a
+    duplicate request. A caller that gives up does not cancel it for the rest,
+    but once every caller has given up the request itself is cancelled so it
+    stops holding a provider slot.
+    """
+
+    def __init__(self):
+        self.in_flight = {}
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def run(self, key, factory):
+        """
+        Run ``factory()`` for ``key`` unless an identical call is already running
+
+        Args:
+            key: Request fingerprint
+            factory: Zero-argument callable returning the awaitable to run
+
+        Returns:
+            The shared result
+        """
+        flight = self.in_flight.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self.in_flight[key] = flight
+            flight.task.add_done_callback(lambda done: self._finish(key, flight))
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                self.abandoned += 1
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key, flight):
+        if self.in_flight.get(key) is flight:
+            del self.in_flight[key]
+
+    def _finish(self, key, flight):
+        self._forget(key, flight)
+        # Mark the error as retrieved in case every waiter already gave up
+        if not flight.task.cancelled():
+            flight.task.exception()
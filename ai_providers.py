@@ -0,0 +1,375 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import time
+
+from ai_budget import usage_ledger
+from ai_circuit import CircuitBreaker, CircuitOpen, is_provider_failure
+from ai_scheduler import request_origin
+from ai_transport import DEFAULT_MODEL, OPENROUTER_URL, AITransportError, parse_chat_choices
+from metrics import AI_TOKENS, command_label
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAIChatAdapter:
+    """OpenAI-compatible chat completions (OpenRouter, OpenAI, most proxies)"""
+
+    name = 'openai'
+    streaming = True
+
+    def headers(self, api_key):
+        return {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def build_payload(self, model, messages, n, max_tokens, temperature):
+        payload = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+        if n > 1:
+            payload["n"] = n
+        return payload
+
+    def parse(self, data):
+        return parse_chat_choices(data)
+
+
+class GenericCompletionAdapter:
+    """
+    Plain prompt-in, text-out endpoints
+
+    Understands the OpenAI text/chat, legacy Anthropic ``completion`` and
+    bare ``response``/``output``/``text`` response shapes. Only ever
+    returns a single completion.
+    """
+
+    name = 'generic'
+    streaming = False
+
+    def headers(self, api_key):
+        return {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def build_payload(self, model, messages, n, max_tokens, temperature):
+        payload = {
+            'prompt': "\n\n".join(message['content'] for message in messages),
+            'max_tokens': max_tokens,
+            'temperature': temperature
+        }
+        if model:
+            payload['model'] = model
+        return payload
+
+    def parse(self, data):
+        text = None
+        if not isinstance(data, dict):
+            pass
+        # OpenAI format
+        elif data.get('choices'):
+            choice = data['choices'][0]
+            text = choice.get('text') or (choice.get('message') or {}).get('content')
+        # Anthropic/Claude format
+        elif 'completion' in data:
+            text = data['completion']
+        # Generic formats
+        elif 'response' in data:
+            text = data['response']
+        elif 'output' in data:
+            text = data['output']
+        elif 'text' in data:
+            text = data['text']
+
+        if not isinstance(text, str) or not text.strip():
+            raise AITransportError("AI API returned an empty or unrecognised response")
+        return [text.strip()]
+
+
+# Set by AI worker processes to a list that collects (prompt, completion) token
+# counts, which go back to the front end with the job's result
+usage_sink = contextvars.ContextVar('usage_sink', default=None)
+
+
+def record_usage(data):
+    """Count the tokens an OpenAI-style ``usage`` block reports against the current command and its guild"""
+    usage = data.get('usage') if isinstance(data, dict) else None
+    if not isinstance(usage, dict):
+        return
+    counts = [usage.get(f'{kind}_tokens') for kind in ('prompt', 'completion')]
+    counts = [tokens if isinstance(tokens, int) else 0 for tokens in counts]
+    sink = usage_sink.get()
+    if sink is not None:
+        sink.append(counts)
+    else:
+        count_usage(*counts)
+
+
+def count_usage(prompt_tokens, completion_tokens):
+    """Add one call's tokens to the metrics and the usage ledger, for the current command"""
+    origin = request_origin.get()
+    label = command_label(origin)
+    AI_TOKENS.inc(label, 'prompt', amount=prompt_tokens)
+    AI_TOKENS.inc(label, 'completion', amount=completion_tokens)
+    usage_ledger.record(origin, prompt_tokens, completion_tokens)
+
+
+ADAPTERS = {adapter.name: adapter for adapter in (OpenAIChatAdapter(), GenericCompletionAdapter())}
+
+
+class Provider:
+    """One AI backend: endpoint, credentials, model (and cheaper economy model), response adapter and health"""
+
+    def __init__(self, name, url, api_key, model=None, adapter='openai', cost=1.0, breaker=None, economy_model=None):
+        self.name = name
+        self.url = url
+        self.api_key = api_key
+        self.model = model
+        self.economy_model = economy_model
+        self.adapter = ADAPTERS[adapter]
+        self.cost = cost
+        self.breaker = breaker or CircuitBreaker()
+
+    def expected_latency(self):
+        """Recent median latency (0 until measured, so new backends get tried)"""
+        return self.breaker.latency_percentile(0.5)
+
+    def hedge_delay(self, default):
+        """How long to wait for this backend before asking another one too"""
+        if len(self.breaker.latencies) < self.breaker.min_samples:
+            return default
+        return self.breaker.latency_percentile(0.9)
+
+    def model_for(self, economy):
+        return self.economy_model if economy and self.economy_model else self.model
+
+    async def complete(self, transport, messages, n=1, max_tokens=150, temperature=0.9, economy=False):
+        """
+        Run a completion against this backend through its circuit breaker
+
+        Returns:
+            List of completion texts (at most ``n``, at least one)
+        """
+        payload = self.adapter.build_payload(self.model_for(economy), messages, n, max_tokens, temperature)
+        headers = self.adapter.headers(self.api_key)
+
+        async def request(timeout):
+            data = await transport.post_json(self.url, payload, headers=headers, timeout=timeout)
+            texts = self.adapter.parse(data)
+            record_usage(data)
+            return texts
+
+        return await self.breaker.call(request)
+
+    def stream(self, transport, messages, max_tokens=150, temperature=0.9, economy=False):
+        """Stream a chat completion (only for adapters with ``streaming``)"""
+        return transport.stream_chat_completion(
+            self.api_key, messages, model=self.model_for(economy), max_tokens=max_tokens,
+            temperature=temperature, url=self.url, timeout=self.breaker.timeout()
+        )
+
+
+async def stream_through_breaker(provider, transport, reply, messages, max_tokens, temperature, economy=False):
+    """Feed a streamed completion into ``reply``, judging provider health by time to first token"""
+    breaker = provider.breaker
+    breaker.before_call()
+    start = time.monotonic()
+    first_token = False
+    try:
+        async for delta in provider.stream(transport, messages, max_tokens=max_tokens, temperature=temperature, economy=economy):
+            if not first_token:
+                first_token = True
+                breaker.record_success(time.monotonic() - start)
+            await reply.feed(delta)
+    except asyncio.CancelledError:
+        breaker.record_cancel()
+        raise
+    except Exception as e:
+        if is_provider_failure(e):
+            breaker.record_failure()
+        else:
+            breaker.record_cancel()
+        raise
+    if not first_token:
+        breaker.record_failure()
+
+
+class ProviderRouter:
+    """
+    Send each AI request to the best healthy backend, hedging slow ones
+
+    Backends whose circuit is open are skipped. The rest are ranked by
+    ``latency_weight * median latency + cost_weight * cost``. If the chosen
+    backend hasn't answered by its p90 latency, the request is also sent to
+    the next one and whichever answers first wins. A backend that fails
+    outright is replaced by the next one straight away.
+    """
+
+    def __init__(self, providers, latency_weight=1.0, cost_weight=1.0, hedge_delay=3.0):
+        self.providers = providers
+        self.latency_weight = latency_weight
+        self.cost_weight = cost_weight
+        self.hedge_delay = hedge_delay
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def is_open(self):
+        """Whether every backend is refusing calls"""
+        return all(provider.breaker.is_open for provider in self.providers)
+
+    @property
+    def has_economy(self):
+        """Whether any backend has a cheaper model for guilds over their token quota"""
+        return any(provider.economy_model for provider in self.providers)
+
+    def ranked(self, streaming=False, economy=False):
+        """Healthy backends (only those with an economy model when ``economy``), best first"""
+        healthy = [
+            provider for provider in self.providers
+            if not provider.breaker.is_open and (provider.adapter.streaming or not streaming)
+            and (provider.economy_model or not economy)
+        ]
+        return sorted(healthy, key=lambda provider: (
+            self.latency_weight * provider.expected_latency() + self.cost_weight * provider.cost
+        ))
+
+    def stream_provider(self, economy=False):
+        """Best healthy backend that can stream, or None"""
+        ranked = self.ranked(streaming=True, economy=economy)
+        return ranked[0] if ranked else None
+
+    async def complete(self, transport, messages, n=1, max_tokens=150, temperature=0.9, economy=False):
+        """
+        Run a completion on the best backend, hedging and failing over as needed
+
+        With ``economy`` only backends with an economy model are used, on that model.
+
+        Returns:
+            List of completion texts from whichever backend answered first
+
+        Raises:
+            CircuitOpen: When no backend is healthy
+        """
+        remaining = self.ranked(economy=economy)
+        if not remaining:
+            raise CircuitOpen("No healthy AI provider")
+
+        pending = {}
+
+        def launch():
+            provider = remaining.pop(0)
+            task = asyncio.ensure_future(provider.complete(transport, messages, n, max_tokens, temperature, economy))
+            pending[task] = provider
+            return provider
+
+        primary = launch()
+        hedged = False
+        error = None
+        try:
+            while pending:
+                wait = primary.hedge_delay(self.hedge_delay) if remaining and not hedged else None
+                done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self.hedges += 1
+                    backup = launch()
+                    logger.info("Hedging slow AI request from %s to %s", primary.name, backup.name)
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        if provider is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+                    logger.warning(f"AI provider {provider.name} failed: {error}")
+
+                if not pending and remaining:
+                    launch()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        """Per-backend health and latency plus hedge counters"""
+        return {
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'providers': {provider.name: provider.breaker.stats() for provider in self.providers}
+        }
+
+
+def load_providers(breaker_factory=CircuitBreaker):
+    """
+    Build the backend list from the environment
+
+    OPENROUTER_API_KEY adds OpenRouter (model from AI_MODEL, economy model
+    from AI_ECONOMY_MODEL). AI_API_URL and AI_API_KEY add a custom endpoint
+    (AI_API_ADAPTER picks the response shape, 'generic' by default).
+    AI_PROVIDERS may hold a JSON list of extra backends:
+    ``{"name", "url", "api_key_env", "model", "economy_model", "adapter", "cost"}``.
+    """
+    providers = []
+    if os.getenv('OPENROUTER_API_KEY'):
+        providers.append(Provider(
+            'openrouter', OPENROUTER_URL, os.getenv('OPENROUTER_API_KEY'),
+            model=os.getenv('AI_MODEL', DEFAULT_MODEL),
+            economy_model=os.getenv('AI_ECONOMY_MODEL'),
+            cost=float(os.getenv('OPENROUTER_COST', '1.0')),
+            breaker=breaker_factory()
+        ))
+    if os.getenv('AI_API_URL') and os.getenv('AI_API_KEY'):
+        providers.append(Provider(
+            'custom', os.getenv('AI_API_URL'), os.getenv('AI_API_KEY'),
+            model=os.getenv('AI_API_MODEL'),
+            adapter=os.getenv('AI_API_ADAPTER', 'generic'),
+            cost=float(os.getenv('AI_API_COST', '1.0')),
+            breaker=breaker_factory()
+        ))
+    try:
+        extra = json.loads(os.getenv('AI_PROVIDERS', '[]'))
+    except ValueError:
+        logger.error("AI_PROVIDERS is not valid JSON - ignoring it")
+        extra = []
+    for spec in extra:
+        api_key = os.getenv(spec.get('api_key_env', ''))
+        if not api_key or spec.get('adapter', 'openai') not in ADAPTERS:
+            logger.warning(f"Skipping AI provider {spec.get('name')}: missing key or unknown adapter")
+            continue
+        providers.append(Provider(
+            spec['name'], spec['url'], api_key,
+            model=spec.get('model', DEFAULT_MODEL),
+            economy_model=spec.get('economy_model'),
+            adapter=spec.get('adapter', 'openai'),
+            cost=float(spec.get('cost', 1.0)),
+            breaker=breaker_factory()
+        ))
+    return providers
+
+
+def router_from_env():
+    """
+    The backends from :func:`load_providers`, each with a circuit breaker
+    (AI_BREAKER_FAILURES, AI_BREAKER_COOLDOWN, AI_MAX_TIMEOUT), in a router
+    weighted by AI_LATENCY_WEIGHT and AI_COST_WEIGHT that hedges after AI_HEDGE_DELAY
+    """
+    return ProviderRouter(
+        load_providers(lambda: CircuitBreaker(
+            failure_threshold=int(os.getenv('AI_BREAKER_FAILURES', '5')),
+            cooldown=float(os.getenv('AI_BREAKER_COOLDOWN', '30')),
+            max_timeout=float(os.getenv('AI_MAX_TIMEOUT', '10'))
+        )),
+        latency_weight=float(os.getenv('AI_LATENCY_WEIGHT', '1.0')),
+        cost_weight=float(os.getenv('AI_COST_WEIGHT', '1.0')),
+        hedge_delay=float(os.getenv('AI_HEDGE_DELAY', '3.0'))
+    )
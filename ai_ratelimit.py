@@ -0,0 +1,282 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class _Bucket:
+    """Tokens left and when that was last worked out"""
+
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets kept in an SQLite file, for scopes several processes share
+
+    Used when the bot runs as several shard processes: a user can be in
+    guilds on different shards, so their bucket has to be one row every
+    process charges. Each charge is one short ``BEGIN IMMEDIATE``
+    transaction; refill is worked out with wall-clock time, since that is
+    the only clock the processes share. :meth:`take` blocks, so callers on
+    the event loop run it in a thread.
+    """
+
+    def __init__(self, path, busy_timeout=0.05, prune_every=1000):
+        """
+        Args:
+            path: SQLite file shared by the processes
+            busy_timeout: Seconds to wait for another process's charge before
+                letting the request through unmetered
+            prune_every: Charges between sweeps of refilled buckets
+        """
+        self.db = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets (scope TEXT NOT NULL, owner INTEGER NOT NULL, "
+            "tokens REAL NOT NULL, updated REAL NOT NULL, PRIMARY KEY (scope, owner)) WITHOUT ROWID"
+        )
+        self.prune_every = prune_every
+        # One transaction at a time on the shared connection
+        self.lock = threading.Lock()
+        self.charges = 0
+        self.busy = 0
+
+    def take(self, charges, now=None):
+        """
+        Charge every bucket in ``charges`` or none of them
+
+        Args:
+            charges: (scope, owner, capacity, rate, cost) per bucket
+            now: Wall-clock time (defaults to time.time())
+
+        Returns:
+            True if paid, False if some bucket is short, None if the store
+            was busy for longer than ``busy_timeout`` (callers let the
+            request through)
+        """
+        with self.lock:
+            return self._take(charges, time.time() if now is None else now)
+
+    def _take(self, charges, now):
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            self.busy += 1
+            return None
+        try:
+            levels = []
+            for scope, owner, capacity, rate, cost in charges:
+                row = self.db.execute(
+                    "SELECT tokens, updated FROM rate_buckets WHERE scope = ? AND owner = ?", (scope, owner)
+                ).fetchone()
+                levels.append(capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate))
+            if any(level < charge[4] for level, charge in zip(levels, charges)):
+                self.db.execute("ROLLBACK")
+                return False
+            self.db.executemany(
+                "INSERT OR REPLACE INTO rate_buckets (scope, owner, tokens, updated) VALUES (?, ?, ?, ?)",
+                [(scope, owner, level - cost, now) for (scope, owner, _, _, cost), level in zip(charges, levels)]
+            )
+            self.charges += 1
+            if self.charges % self.prune_every == 0:
+                self._prune(charges, now)
+            self.db.execute("COMMIT")
+            return True
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def _prune(self, charges, now):
+        # Drop buckets of the charged scopes that have refilled (a full bucket is the same as none)
+        for scope, capacity, rate in {(scope, capacity, rate) for scope, _, capacity, rate, _ in charges}:
+            self.db.execute(
+                "DELETE FROM rate_buckets WHERE scope = ? AND tokens + (? - updated) * ? >= ?",
+                (scope, now, rate, capacity)
+            )
+
+    def close(self):
+        self.db.close()
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets per user, channel and guild for AI spend
+
+    Each scope has a capacity and a refill rate in tokens per second; a
+    request costs its ``max_tokens`` and is only let through if every bucket
+    it touches can pay for it. A bucket that has refilled to capacity is the
+    same as no bucket, so idle ones are dropped from the front of an LRU
+    order, and at most ``max_buckets`` are kept either way.
+
+    Scopes passed to :meth:`share` are charged in a
+    :class:`SQLiteBucketStore` instead, so every process sees one bucket.
+    """
+
+    def __init__(self, limits, max_buckets=50000):
+        """
+        Args:
+            limits: Scope name -> (capacity, tokens refilled per second);
+                scopes left out are not limited
+            max_buckets: Hard cap on buckets kept in memory
+        """
+        self.limits = limits
+        self.max_buckets = max_buckets
+        # (scope, owner id) -> _Bucket, least recently used first
+        self.buckets = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+        self.shared = None
+        self.shared_scopes = ()
+
+    def share(self, store, scopes):
+        """Charge ``scopes`` in ``store`` (shared between processes) instead of in memory"""
+        self.shared = store
+        self.shared_scopes = tuple(scope for scope in scopes if scope in self.limits)
+
+    def _level(self, key, now):
+        capacity, rate = self.limits[key[0]]
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            return capacity
+        return min(capacity, bucket.tokens + (now - bucket.updated) * rate)
+
+    async def consume(self, cost, now=None, **owners):
+        """
+        Take ``cost`` tokens from each owner's bucket, or from none of them
+
+        In-memory buckets are charged first, as a reservation that is
+        refunded if a shared bucket turns the request down; the shared
+        charge runs in a thread so the event loop never waits on SQLite.
+
+        Args:
+            cost: Tokens the request may use (capped at each bucket's capacity
+                so a big request is slow rather than impossible)
+            now: Monotonic time (defaults to time.monotonic())
+            **owners: Owner id per scope, e.g. ``user=..., channel=..., guild=...``;
+                None ids are skipped
+
+        Returns:
+            True if the request may go ahead
+        """
+        now = time.monotonic() if now is None else now
+        keys = [
+            (scope, owner) for scope, owner in owners.items()
+            if owner is not None and scope in self.limits and scope not in self.shared_scopes
+        ]
+        levels = [self._level(key, now) for key in keys]
+        costs = [min(cost, self.limits[key[0]][0]) for key in keys]
+
+        if any(level < key_cost for level, key_cost in zip(levels, costs)):
+            self.limited += 1
+            return False
+
+        for key, level, key_cost in zip(keys, levels, costs):
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                self.buckets[key] = _Bucket(level - key_cost, now)
+            else:
+                bucket.tokens, bucket.updated = level - key_cost, now
+                self.buckets.move_to_end(key)
+        self._evict(now)
+
+        shared = [
+            (scope, owner, *self.limits[scope], min(cost, self.limits[scope][0]))
+            for scope, owner in owners.items() if owner is not None and scope in self.shared_scopes
+        ]
+        if shared:
+            try:
+                taken = await asyncio.to_thread(self.shared.take, shared)
+            except asyncio.CancelledError:
+                # The command was abandoned mid-charge: don't leave the reservation held
+                self._refund(keys, costs)
+                raise
+            if taken is False:
+                self._refund(keys, costs)
+                self.limited += 1
+                return False
+
+        self.allowed += 1
+        return True
+
+    def _refund(self, keys, costs):
+        for key, key_cost in zip(keys, costs):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.tokens += key_cost
+
+    def _evict(self, now):
+        while self.buckets:
+            key = next(iter(self.buckets))
+            if len(self.buckets) <= self.max_buckets and self._level(key, now) < self.limits[key[0]][0]:
+                break
+            del self.buckets[key]
+
+    def snapshot(self):
+        """Buckets that aren't full, as JSON-ready data stamped with wall-clock time"""
+        now = time.monotonic()
+        return {
+            'saved_at': time.time(),
+            'buckets': [
+                [scope, owner, level]
+                for (scope, owner), level in ((key, self._level(key, now)) for key in self.buckets)
+                if level < self.limits[scope][0]
+            ]
+        }
+
+    def restore(self, state):
+        """Load a :meth:`snapshot`, crediting the refill earned while the bot was down"""
+        now = time.monotonic()
+        elapsed = max(0.0, time.time() - state['saved_at'])
+        for scope, owner, tokens in state['buckets']:
+            if scope not in self.limits:
+                continue
+            capacity, rate = self.limits[scope]
+            tokens = tokens + elapsed * rate
+            if tokens < capacity:
+                self.buckets[(scope, owner)] = _Bucket(tokens, now)
+        self._evict(now)
+
+    def save(self, path):
+        """Write a snapshot to ``path`` (atomically, via a temp file)"""
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        """Restore a snapshot from ``path`` if there is a usable one"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.restore(json.load(f))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable rate limit state {path}: {e}")
+            return
+        logger.info(f"Restored {len(self.buckets)} rate limit buckets from {path}")
+
+    def stats(self):
+        return {
+            'buckets': len(self.buckets), 'allowed': self.allowed, 'limited': self.limited,
+            'shared_busy': self.shared.busy if self.shared else 0
+        }
+
+
+def parse_limit(value):
+    """``"capacity:per_second"`` -> (capacity, per_second); empty or ``0`` means unlimited (None)"""
+    if not value or value == '0':
+        return None
+    capacity, _, rate = value.partition(':')
+    return float(capacity), float(rate or capacity)
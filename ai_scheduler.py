@@ -0,0 +1,168 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+
+from metrics import AI_QUEUE_WAIT_SECONDS, command_label
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerBusy(Exception):
+    """Raised when the AI request queue is full and the request is shed"""
+
+
+class RequestOrigin:
+    """Who triggered the current AI request, when it stops being useful, and whether it was shed or rate limited"""
+
+    __slots__ = ('guild_id', 'user_id', 'command', 'deadline', 'channel_id', 'shed', 'limited')
+
+    def __init__(self, guild_id=None, user_id=None, command=None, deadline=None, channel_id=None):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.command = command
+        self.channel_id = channel_id
+        # Event loop time after which AI work for this command is cancelled
+        self.deadline = deadline
+        self.shed = False
+        self.limited = False
+
+
+# Set once per command invocation so the AI layer can see who is asking
+request_origin = contextvars.ContextVar('request_origin', default=None)
+
+
+class _RoundRobin:
+    """Keyed queues served in rotation"""
+
+    def __init__(self):
+        self.order = deque()
+        self.items = {}
+
+    def __bool__(self):
+        return bool(self.order)
+
+    def get(self, key, factory):
+        if key not in self.items:
+            self.items[key] = factory()
+            self.order.append(key)
+        return self.items[key]
+
+    def pop_next(self):
+        key = self.order.popleft()
+        return key, self.items[key]
+
+    def requeue(self, key):
+        self.order.append(key)
+
+    def drop(self, key):
+        del self.items[key]
+
+
+class AIScheduler:
+    """
+    Central admission control for AI requests
+
+    Caps the number of provider calls in flight, queues the rest in a
+    bounded queue served round-robin across guilds (and across users inside
+    each guild), and sheds new requests immediately once the queue is full.
+    """
+
+    def __init__(self, max_concurrency=4, max_queue=50, sample_size=500):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.queued = 0
+        self.shed_count = 0
+        self.guilds = _RoundRobin()
+        self.wait_times = deque(maxlen=sample_size)
+
+    async def run(self, factory, origin=None):
+        """
+        Run ``factory()`` once a slot is free
+
+        Args:
+            factory: Zero-argument callable returning the awaitable to run
+            origin: RequestOrigin used for fairness (defaults to the current one)
+
+        Raises:
+            SchedulerBusy: When the queue is full
+        """
+        await self.acquire(origin or request_origin.get())
+        try:
+            return await factory()
+        finally:
+            self.release()
+
+    async def acquire(self, origin=None):
+        """Wait for a free slot, honouring per-guild and per-user fairness"""
+        if self.active < self.max_concurrency and self.queued == 0:
+            self.active += 1
+            self.wait_times.append(0.0)
+            AI_QUEUE_WAIT_SECONDS.observe(0.0, command_label(origin))
+            return
+
+        if self.queued >= self.max_queue:
+            self.shed_count += 1
+            raise SchedulerBusy(f"AI queue full ({self.queued} waiting)")
+
+        guild_id = origin.guild_id if origin else None
+        user_id = origin.user_id if origin else None
+        users = self.guilds.get(guild_id, _RoundRobin)
+        future = asyncio.get_running_loop().create_future()
+        users.get(user_id, deque).append(future)
+        self.queued += 1
+
+        start = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just as the caller gave up
+                self.release()
+            else:
+                self.queued -= 1
+            raise
+        self.wait_times.append(time.monotonic() - start)
+        AI_QUEUE_WAIT_SECONDS.observe(self.wait_times[-1], command_label(origin))
+
+    def release(self):
+        """Free a slot and hand it to the next waiter in rotation"""
+        self.active -= 1
+        while self.active < self.max_concurrency and self.guilds:
+            future = self._next_waiter()
+            if future.cancelled():
+                continue
+            self.queued -= 1
+            self.active += 1
+            future.set_result(None)
+
+    def _next_waiter(self):
+        guild_id, users = self.guilds.pop_next()
+        user_id, futures = users.pop_next()
+        future = futures.popleft()
+
+        if futures:
+            users.requeue(user_id)
+        else:
+            users.drop(user_id)
+        if users:
+            self.guilds.requeue(guild_id)
+        else:
+            self.guilds.drop(guild_id)
+        return future
+
+    def stats(self):
+        """Queue depth and recent wait times, for sizing the limits"""
+        waits = sorted(self.wait_times)
+        return {
+            'active': self.active,
+            'max_concurrency': self.max_concurrency,
+            'queued': self.queued,
+            'max_queue': self.max_queue,
+            'shed': self.shed_count,
+            'wait_avg': sum(waits) / len(waits) if waits else 0.0,
+            'wait_p95': waits[int(len(waits) * 0.95)] if waits else 0.0,
+            'wait_max': waits[-1] if waits else 0.0
+        }
@@ -0,0 +1,396 @@
+import asyncio
+import logging
+import os
+import time
+
+import fallbacks
+from ai_transport import AITransport
+from ai_stream import ProgressiveMessage
+from ai_circuit import CircuitOpen
+from ai_providers import router_from_env, stream_through_breaker
+from ai_worker import AIWorkerPool
+from ai_concurrency import SingleFlight
+from roast_pool import RoastPool, TEMPLATE_TARGET
+from ai_cache import MemoryCacheBackend, ResponseCache, SQLiteCacheBackend, parse_policy
+from ai_scheduler import AIScheduler, SchedulerBusy, request_origin
+from ai_ratelimit import SQLiteBucketStore, TokenBucketLimiter, parse_limit
+from ai_budget import ECONOMY, OVER_BUDGET, usage_ledger
+from metrics import AI_PROMPT_VERSIONS, AI_PROVIDER_SECONDS, AI_REQUESTS, AI_TOKENS, REGISTRY, command_label
+from prompts import prompts
+
+logger = logging.getLogger(__name__)
+
+# Shared async connection pool for every AI call (opened at startup, closed on shutdown)
+ai_transport = AITransport()
+
+# Global cap on concurrent AI calls with a bounded, per-guild fair queue
+ai_scheduler = AIScheduler(
+    max_concurrency=int(os.getenv('AI_MAX_CONCURRENCY', '4')),
+    max_queue=int(os.getenv('AI_MAX_QUEUE', '50'))
+)
+
+# AI backends (OpenRouter, AI_API_URL, AI_PROVIDERS). Each has its own circuit breaker so a
+# failing one is skipped instantly; timeouts follow its recent p95 and slow calls are hedged.
+ai_router = router_from_env()
+
+# AI_WORKERS=N moves provider calls (HTTP, JSON parsing, retries, hedging) into N worker
+# processes fed over Unix sockets, so generation load stays off the gateway's event loop.
+# Caching, coalescing, queueing, rate limits and quotas stay here.
+ai_workers = AIWorkerPool(int(os.getenv('AI_WORKERS', '0')), os.getenv('AI_WORKER_SOCKET_DIR'))
+
+# AI spend per user, channel and guild, in tokens ("capacity:refill per second"); each call costs
+# its max_tokens. Over the limit, commands answer from fallbacks. RATE_LIMIT_STATE is a JSON
+# file the buckets are saved to on shutdown and restored from at startup.
+rate_limiter = TokenBucketLimiter({
+    scope: limit for scope, limit in (
+        ('user', parse_limit(os.getenv('RATE_LIMIT_USER', '1000:5'))),
+        ('channel', parse_limit(os.getenv('RATE_LIMIT_CHANNEL', '3000:20'))),
+        ('guild', parse_limit(os.getenv('RATE_LIMIT_GUILD', '10000:60')))
+    ) if limit
+})
+rate_limit_state = os.getenv('RATE_LIMIT_STATE')
+if rate_limit_state:
+    rate_limiter.load(rate_limit_state)
+# RATE_LIMIT_SHARED_PATH keeps user buckets in an SQLite file every shard process charges
+# (guilds and their channels live on one shard, so those buckets stay in memory)
+if os.getenv('RATE_LIMIT_SHARED_PATH'):
+    rate_limiter.share(SQLiteBucketStore(os.getenv('RATE_LIMIT_SHARED_PATH')), ('user',))
+
+# Seconds a command's AI work may run before it is cancelled and the fallback is used
+AI_COMMAND_DEADLINE = float(os.getenv('AI_COMMAND_DEADLINE', '20'))
+
+# Identical prompts already in flight share one provider call
+ai_single_flight = SingleFlight()
+
+# Reuse answers for prompts that only depend on names and fixed text.
+# AI_CACHE_TTL is the default reuse window; AI_CACHE_POLICY ("command=seconds,...") sets it per
+# command, adds commands or turns one off with 0. AI_CACHE_PATH switches to an SQLite file so the
+# cache survives restarts.
+ai_cache_ttl = int(os.getenv('AI_CACHE_TTL', '600'))
+if os.getenv('AI_CACHE_PATH'):
+    cache_backend = SQLiteCacheBackend(os.getenv('AI_CACHE_PATH'))
+else:
+    cache_backend = MemoryCacheBackend(max_bytes=int(os.getenv('AI_CACHE_MAX_BYTES', '2000000')))
+response_cache = ResponseCache(cache_backend, parse_policy(os.getenv('AI_CACHE_POLICY'), {
+    command: ai_cache_ttl for command in ('truth', 'fortune', 'therapy', 'advice', 'compare')
+}))
+
+# Stream long replies into a message that fills in as tokens arrive (AI_STREAMING=1 enables it)
+ai_streaming = os.getenv('AI_STREAMING', '0') == '1'
+stream_edit_interval = float(os.getenv('AI_STREAM_EDIT_INTERVAL', '1.0'))
+
+# Optional warm pool of ready-made roast templates (ROAST_POOL_SIZE=0 disables it)
+roast_pool = RoastPool(size=int(os.getenv('ROAST_POOL_SIZE', '0')))
+
+if ai_router.providers:
+    logger.info(f"AI providers initialized for AI-powered roasts: {', '.join(p.name for p in ai_router.providers)}")
+else:
+    logger.warning("No AI API key found - using fallback roasts")
+
+REGISTRY.gauge('ai_in_flight', "AI calls holding a scheduler slot", lambda: {(): ai_scheduler.active})
+REGISTRY.gauge('ai_queue_depth', "AI calls waiting for a scheduler slot", lambda: {(): ai_scheduler.queued})
+REGISTRY.gauge(
+    'ai_circuit_open', "1 while a provider's circuit breaker is refusing calls",
+    lambda: {(provider.name,): int(provider.breaker.is_open) for provider in ai_router.providers}, ('provider',)
+)
+REGISTRY.gauge(
+    'ai_worker_jobs', "AI jobs in flight per worker process (AI_WORKERS)",
+    lambda: {(str(index),): jobs for index, jobs in enumerate(ai_workers.stats()['jobs']) if jobs is not None}, ('worker',)
+)
+
+# Seconds a multi-generation command (battle) waits before filling slow slots with fallbacks
+MULTI_GENERATION_DEADLINE = 8
+
+def fallback_roast(target_name):
+    """Pick a built-in roast for the target"""
+    return fallbacks.pick('roast', target=target_name)
+
+# Appended to pool prompts so the result can be reused for any target
+TEMPLATE_INSTRUCTION = f"\n\nRefer to the target only as {TEMPLATE_TARGET}, written exactly like that, every time you mention them."
+
+def prompt_for(name):
+    """The version of prompt ``name`` the current user is on (A/B splits stick per user)"""
+    origin = request_origin.get()
+    template = prompts.get(name, origin.user_id if origin else None)
+    AI_PROMPT_VERSIONS.inc(name, template.version)
+    return template
+
+async def prompt_request(name, **fields):
+    """Run registered prompt ``name`` with ``fields`` filled in (None if the AI failed)"""
+    template = prompt_for(name)
+    return await make_ai_request(
+        template.render(**fields), template.system, template.max_tokens, template.temperature, template.fingerprint
+    )
+
+async def stream_prompt_request(ctx, name, render=None, **fields):
+    """:func:`stream_ai_request` for registered prompt ``name``"""
+    template = prompt_for(name)
+    return await stream_ai_request(
+        ctx, template.render(**fields), template.system, template.max_tokens, template.temperature, render,
+        template.fingerprint
+    )
+
+async def get_ai_roast(target_name):
+    """Get a dark, unhinged AI-generated roast"""
+    # Serve a pre-generated roast instantly when the warm pool has one
+    roast = roast_pool.take('roast', target_name)
+    if roast:
+        return roast
+
+    roast = await prompt_request('roast', target=target_name)
+    if roast:
+        logger.debug("Generated AI roast for %s", target_name)
+        return roast
+
+    # Use fallback if no AI or the request failed
+    return fallback_roast(target_name)
+
+def command_deadline():
+    """Cancel the enclosed AI work once the current command's deadline passes"""
+    origin = request_origin.get()
+    return asyncio.timeout_at(origin.deadline if origin else None)
+
+def budget_tier(origin):
+    """The guild's budget tier for this AI call (background work is never budgeted), flagging the command if out of budget"""
+    if origin is None:
+        return None
+    tier = usage_ledger.tier(origin.guild_id, economy_available=ai_router.has_economy)
+    if tier == OVER_BUDGET:
+        origin.limited = True
+        logger.info("AI request for %s refused: guild %s is over its daily token quota", origin.command, origin.guild_id)
+    return tier
+
+async def within_rate_limit(origin, max_tokens):
+    """Charge the command's user, channel and guild for an AI call, flagging the command if refused"""
+    if origin is None:
+        return True
+    if await rate_limiter.consume(max_tokens, user=origin.user_id, channel=origin.channel_id, guild=origin.guild_id):
+        return True
+    origin.limited = True
+    logger.info("AI request for %s rate limited (user %s)", origin.command, origin.user_id)
+    return False
+
+async def timed_completion(command, messages, **options):
+    """Run a routed completion, recording the provider time against ``command``"""
+    start = time.monotonic()
+    try:
+        if ai_workers.enabled:
+            return await ai_workers.complete(messages, **options)
+        return await ai_router.complete(ai_transport, messages, **options)
+    finally:
+        AI_PROVIDER_SECONDS.observe(time.monotonic() - start, command)
+
+async def make_ai_request(prompt, system_prompt, max_tokens=150, temperature=0.9, fingerprint=None):
+    """
+    Helper function to make AI requests via the configured providers
+
+    ``fingerprint`` (from a registered prompt) stands in for the system
+    prompt in cache and coalescing keys.
+    """
+    if not ai_router.providers:
+        return None
+    
+    origin = request_origin.get()
+    command = origin.command if origin else None
+    label = command_label(origin)
+    cache_key = None
+    if response_cache.allows(command):
+        cache_key = response_cache.make_key(command, fingerprint or system_prompt, prompt, max_tokens, temperature)
+        cached = await response_cache.get(cache_key)
+        if cached:
+            AI_REQUESTS.inc(label, 'cache')
+            return cached
+    
+    if ai_router.is_open:
+        AI_REQUESTS.inc(label, 'circuit_open')
+        return None
+    tier = budget_tier(origin)
+    if tier == OVER_BUDGET:
+        AI_REQUESTS.inc(label, 'over_budget')
+        return None
+    if not await within_rate_limit(origin, max_tokens):
+        AI_REQUESTS.inc(label, 'limited')
+        return None
+    economy = tier == ECONOMY
+    if origin:
+        # Live command traffic: keep the warm pool from refilling alongside it
+        roast_pool.touch()
+    
+    deadline = command_deadline()
+    try:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        flight_key = ResponseCache.make_key(fingerprint or system_prompt, prompt, max_tokens, temperature, economy)
+        async with deadline:
+            choices = await ai_single_flight.run(flight_key, lambda: ai_scheduler.run(
+                lambda: timed_completion(label, messages, max_tokens=max_tokens, temperature=temperature, economy=economy)
+            ))
+        result = choices[0]
+        AI_REQUESTS.inc(label, 'ok')
+        # Economy-model answers are never stored, so guilds on the full model don't get them
+        if cache_key and result and not economy:
+            await response_cache.set(cache_key, result, command)
+        return result
+    
+    except SchedulerBusy as e:
+        logger.warning(f"AI request shed: {e}")
+        AI_REQUESTS.inc(label, 'shed')
+        if origin:
+            origin.shed = True
+        return None
+    except CircuitOpen:
+        AI_REQUESTS.inc(label, 'circuit_open')
+        return None
+    except TimeoutError:
+        if deadline.expired():
+            logger.warning(f"AI request for {command} cancelled at the command deadline")
+            AI_REQUESTS.inc(label, 'deadline')
+        else:
+            logger.warning(f"AI request for {command} timed out at the provider")
+            AI_REQUESTS.inc(label, 'timeout')
+        return None
+    except asyncio.CancelledError:
+        # The caller gave up on this call (e.g. gather_with_deadline); count it before unwinding
+        AI_REQUESTS.inc(label, 'timeout')
+        raise
+    except Exception as e:
+        logger.warning(f"AI request failed: {e}")
+        AI_REQUESTS.inc(label, 'error')
+        return None
+
+async def stream_ai_request(ctx, prompt, system_prompt, max_tokens=150, temperature=0.9, render=None, fingerprint=None):
+    """
+    Make an AI request whose reply is shown while it is being generated
+
+    Returns a ProgressiveMessage and the final text (None if the AI failed).
+    Callers finish the message with the text or their fallback. With
+    streaming off this behaves like make_ai_request and sends nothing early.
+    """
+    reply = ProgressiveMessage(ctx, render, stream_edit_interval)
+    origin = request_origin.get()
+    # Guilds over their quota stream from an economy model when a backend has one
+    economy = origin is not None and usage_ledger.tier(origin.guild_id, ai_router.has_economy) == ECONOMY
+    if not ai_streaming or not ai_router.stream_provider(economy):
+        return reply, await make_ai_request(prompt, system_prompt, max_tokens, temperature, fingerprint)
+    
+    command = origin.command if origin else None
+    label = command_label(origin)
+    cache_key = None
+    if response_cache.allows(command):
+        cache_key = response_cache.make_key(command, fingerprint or system_prompt, prompt, max_tokens, temperature)
+        cached = await response_cache.get(cache_key)
+        if cached:
+            AI_REQUESTS.inc(label, 'cache')
+            return reply, cached
+    
+    if budget_tier(origin) == OVER_BUDGET:
+        AI_REQUESTS.inc(label, 'over_budget')
+        return reply, None
+    if not await within_rate_limit(origin, max_tokens):
+        AI_REQUESTS.inc(label, 'limited')
+        return reply, None
+    roast_pool.touch()
+    
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+    deadline = command_deadline()
+    try:
+        async with deadline:
+            # Hold a scheduler slot for the whole stream
+            await ai_scheduler.acquire(origin)
+            try:
+                start = time.monotonic()
+                try:
+                    if ai_workers.enabled:
+                        await ai_workers.stream(reply, messages, max_tokens, temperature, economy)
+                    else:
+                        provider = ai_router.stream_provider(economy)
+                        if provider is None:
+                            raise CircuitOpen("No healthy streaming AI provider")
+                        await stream_through_breaker(provider, ai_transport, reply, messages, max_tokens, temperature, economy)
+                finally:
+                    AI_PROVIDER_SECONDS.observe(time.monotonic() - start, label)
+                    # Streams carry no usage report: estimate ~4 characters a token
+                    completion_tokens = len(reply.text) // 4
+                    AI_TOKENS.inc(label, 'completion_estimated', amount=completion_tokens)
+                    usage_ledger.record(origin, sum(len(message['content']) for message in messages) // 4, completion_tokens)
+            finally:
+                ai_scheduler.release()
+    except SchedulerBusy as e:
+        logger.warning(f"AI request shed: {e}")
+        AI_REQUESTS.inc(label, 'shed')
+        if origin:
+            origin.shed = True
+        return reply, None
+    except CircuitOpen:
+        AI_REQUESTS.inc(label, 'circuit_open')
+        return reply, None
+    except TimeoutError:
+        if deadline.expired():
+            logger.warning(f"AI stream for {command} cancelled at the command deadline")
+            AI_REQUESTS.inc(label, 'deadline')
+        else:
+            logger.warning(f"AI stream for {command} stalled at the provider")
+            AI_REQUESTS.inc(label, 'timeout')
+        return reply, None
+    except asyncio.CancelledError:
+        AI_REQUESTS.inc(label, 'timeout')
+        raise
+    except Exception as e:
+        logger.warning(f"AI stream failed: {e}")
+        AI_REQUESTS.inc(label, 'error')
+        return reply, None
+    
+    result = reply.text.strip() or None
+    AI_REQUESTS.inc(label, 'ok' if result else 'error')
+    if cache_key and result and not economy:
+        await response_cache.set(cache_key, result, command)
+    return reply, result
+
+async def make_ai_batch_request(prompt, system_prompt, n, max_tokens=150, temperature=0.9, fingerprint=None):
+    """Ask for ``n`` completions of one prompt in a single request (may return fewer)"""
+    if not ai_router.providers or ai_router.is_open:
+        return []
+    
+    label = command_label(request_origin.get())
+    try:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        flight_key = ResponseCache.make_key(fingerprint or system_prompt, prompt, max_tokens, temperature, n)
+        choices = await ai_single_flight.run(flight_key, lambda: ai_scheduler.run(
+            lambda: timed_completion(label, messages, n=n, max_tokens=max_tokens, temperature=temperature)
+        ))
+        AI_REQUESTS.inc(label, 'ok')
+        return choices
+    
+    except SchedulerBusy as e:
+        logger.warning(f"AI batch request shed: {e}")
+        AI_REQUESTS.inc(label, 'shed')
+        return []
+    except CircuitOpen:
+        AI_REQUESTS.inc(label, 'circuit_open')
+        return []
+    except Exception as e:
+        logger.warning(f"AI batch request failed: {e}")
+        AI_REQUESTS.inc(label, 'error')
+        return []
+
+def pool_generator(name):
+    """Generate ``count`` target-agnostic replies from prompt ``name`` for the warm pool"""
+    async def generate(count):
+        template = prompts.get(name)
+        return await make_ai_batch_request(
+            template.render(target=TEMPLATE_TARGET) + TEMPLATE_INSTRUCTION, template.system, count,
+            template.max_tokens, template.temperature, template.fingerprint
+        )
+    return generate
+
+if ai_router.providers:
+    roast_pool.register('roast', pool_generator('roast'))
+    roast_pool.register('roastme', pool_generator('roastme'))
@@ -0,0 +1,67 @@
+import logging
+import re
+import time
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# End of the first complete sentence (or line) in a partial reply
+SENTENCE_END = re.compile(r'[.!?…](?:["\')\]]*)\s|\n')
+
+
+class ProgressiveMessage:
+    """
+    Show a streamed AI reply while it is still being generated
+
+    The first message is sent as soon as the reply contains a full sentence,
+    then edited at most once per ``edit_interval`` seconds (to stay well
+    inside Discord's edit rate limit) until the stream ends.
+    """
+
+    def __init__(self, ctx, render, edit_interval=1.0):
+        """
+        Args:
+            ctx: Command context to send to
+            render: Callable turning the text so far into ``send``/``edit`` kwargs
+            edit_interval: Minimum seconds between edits
+        """
+        self.ctx = ctx
+        self.render = render
+        self.edit_interval = edit_interval
+        self.message = None
+        self.text = ""
+        self.shown = ""
+        self.last_edit = 0.0
+
+    async def feed(self, delta):
+        """Add a streamed fragment and update the message if it's due"""
+        self.text += delta
+        if self.message is None:
+            if SENTENCE_END.search(self.text):
+                self.shown = self.text + " …"
+                self.message = await self.ctx.send(**self.render(self.shown))
+                self.last_edit = time.monotonic()
+        elif time.monotonic() - self.last_edit >= self.edit_interval:
+            await self._edit(self.text + " …")
+
+    async def finish(self, text):
+        """
+        Show the final text, sending or editing as needed
+
+        Returns:
+            The message holding the reply
+        """
+        if self.message is None:
+            self.message = await self.ctx.send(**self.render(text))
+        elif text != self.shown:
+            await self._edit(text)
+        return self.message
+
+    async def _edit(self, text):
+        try:
+            await self.message.edit(**self.render(text))
+        except discord.HTTPException as e:
+            logger.warning(f"Progressive edit failed: {e}")
+        self.shown = text
+        self.last_edit = time.monotonic()
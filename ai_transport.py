@@ -0,0 +1,228 @@
+import json
+import logging
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+DEFAULT_MODEL = "openai/gpt-4o"
+
+
+class AITransportError(Exception):
+    """Raised when the AI provider answers with an error status or unusable body"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_chat_choices(data):
+    """
+    Pull the completion texts out of an OpenAI-style chat completion body
+
+    Raises:
+        AITransportError: When the body has no usable choices
+    """
+    try:
+        texts = [choice['message']['content'].strip() for choice in data['choices']]
+    except (KeyError, TypeError, AttributeError):
+        raise AITransportError("Malformed chat completion response")
+    texts = [text for text in texts if text]
+    if not texts:
+        raise AITransportError("Malformed chat completion response")
+    return texts
+
+
+class AITransport:
+    """
+    Shared async HTTP transport for AI provider calls
+
+    Holds one aiohttp session with a keep-alive connection pool so every
+    command reuses warm TLS connections instead of blocking the event loop
+    with a fresh synchronous request per call.
+    """
+
+    def __init__(self, max_connections=20, timeout=10, keepalive_timeout=60):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.session = None
+
+    async def start(self):
+        """Open the connection pool (safe to call more than once)"""
+        if self.session is not None and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        logger.info(f"AI transport started with {self.max_connections} pooled connections")
+
+    async def close(self):
+        """Close the connection pool"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+            logger.info("AI transport closed")
+        self.session = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def post_json(self, url, payload, headers=None, timeout=None):
+        """
+        POST a JSON payload and return the decoded JSON response
+
+        Args:
+            url: Endpoint to call
+            payload: JSON-serialisable request body
+            headers: Optional request headers
+            timeout: Optional per-call timeout in seconds
+
+        Returns:
+            Decoded JSON body
+
+        Raises:
+            AITransportError: On a non-200 status
+            asyncio.TimeoutError: When the call exceeds its timeout
+            aiohttp.ClientError: On connection failures
+        """
+        if self.session is None or self.session.closed:
+            await self.start()
+
+        request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+        async with self.session.post(url, json=payload, headers=headers, timeout=request_timeout) as response:
+            if response.status != 200:
+                raise AITransportError(f"API error: {response.status}", status=response.status)
+            return await response.json(content_type=None)
+
+    async def chat_completion(self, api_key, messages, model=DEFAULT_MODEL, max_tokens=150,
+                              temperature=0.9, url=OPENROUTER_URL, timeout=None):
+        """
+        Run an OpenAI-compatible chat completion and return the message text
+
+        Args:
+            api_key: Bearer token for the provider
+            messages: Chat messages list
+            model: Model identifier
+            max_tokens: Completion token limit
+            temperature: Sampling temperature
+            url: Chat completions endpoint
+            timeout: Optional per-call timeout in seconds
+
+        Returns:
+            Stripped completion text
+        """
+        choices = await self.chat_completions(api_key, messages, model=model, max_tokens=max_tokens,
+                                              temperature=temperature, url=url, timeout=timeout)
+        return choices[0]
+
+    async def chat_completions(self, api_key, messages, n=1, model=DEFAULT_MODEL, max_tokens=150,
+                               temperature=0.9, url=OPENROUTER_URL, timeout=None):
+        """
+        Ask for ``n`` completions of the same prompt in one request
+
+        Some providers ignore ``n`` and answer with a single choice, so callers
+        must cope with getting fewer completions than they asked for.
+
+        Args:
+            api_key: Bearer token for the provider
+            messages: Chat messages list
+            n: Number of completions to request
+            model: Model identifier
+            max_tokens: Completion token limit per choice
+            temperature: Sampling temperature
+            url: Chat completions endpoint
+            timeout: Optional per-call timeout in seconds
+
+        Returns:
+            List of stripped, non-empty completion texts (never empty)
+        """
+        headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        }
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+        if n > 1:
+            payload["n"] = n
+
+        data = await self.post_json(url, payload, headers=headers, timeout=timeout)
+        return parse_chat_choices(data)
+
+    async def stream_chat_completion(self, api_key, messages, model=DEFAULT_MODEL, max_tokens=150,
+                                     temperature=0.9, url=OPENROUTER_URL, timeout=None):
+        """
+        Stream an OpenAI-compatible chat completion as it is generated
+
+        Parses the server-sent events body line by line and yields each text
+        delta as soon as it arrives.
+
+        Args:
+            api_key: Bearer token for the provider
+            messages: Chat messages list
+            model: Model identifier
+            max_tokens: Completion token limit
+            temperature: Sampling temperature
+            url: Chat completions endpoint
+            timeout: Optional limit in seconds on the gap between chunks
+
+        Yields:
+            Text fragments in order
+
+        Raises:
+            AITransportError: On a non-200 status
+            asyncio.TimeoutError: When the stream stalls for longer than the timeout
+            aiohttp.ClientError: On connection failures
+        """
+        if self.session is None or self.session.closed:
+            await self.start()
+
+        headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream'
+        }
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True
+        }
+
+        # The whole stream may outlast the pool timeout, so only bound the gap between chunks
+        request_timeout = aiohttp.ClientTimeout(total=None, sock_read=timeout or self.timeout)
+        async with self.session.post(url, json=payload, headers=headers, timeout=request_timeout) as response:
+            if response.status != 200:
+                raise AITransportError(f"API error: {response.status}", status=response.status)
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8').strip()
+                # Blank lines separate events; lines starting with ':' are keep-alive comments
+                if not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    return
+                try:
+                    delta = json.loads(data)['choices'][0].get('delta', {}).get('content')
+                except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                    logger.warning("Skipping malformed stream chunk")
+                    continue
+                if delta:
+                    yield delta
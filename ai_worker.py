@@ -0,0 +1,424 @@
+"""
+AI generation in separate worker processes, fed over local Unix sockets
+
+With AI_WORKERS=N the bot starts N worker processes. Each one runs its own
+provider router (circuit breakers, hedging, HTTP pool) and serves jobs on
+a Unix socket. The bot keeps caching, coalescing, queueing, rate limits
+and quotas, and sends each provider call to the worker with the fewest
+jobs in flight. Generation work (HTTP, TLS, JSON parsing, retries) then
+runs on other cores, so the gateway's event loop keeps its heartbeats
+steady under load.
+
+The protocol is one JSON object per line. The bot sends
+``{"id", "op": "complete" | "stream", "messages", "n", "max_tokens",
+"temperature", "economy"}`` or ``{"id", "op": "cancel"}``. A worker answers
+a completion with ``{"id", "texts", "usage"}``, a stream with ``{"id",
+"delta"}`` lines then ``{"id", "done": true}``, and a failure with ``{"id",
+"error", "message", "status"}``.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from ai_circuit import CircuitOpen
+from ai_providers import count_usage, router_from_env, stream_through_breaker, usage_sink
+from ai_transport import AITransport, AITransportError
+
+logger = logging.getLogger(__name__)
+
+# Longest line (a job or a reply) read from a socket
+MAX_LINE = 1 << 20
+
+
+def _send(writer, message):
+    writer.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+
+
+async def _send_drained(writer, message):
+    """Send ``message`` and wait while the peer is behind, so a slow reader can't grow the buffer without bound"""
+    _send(writer, message)
+    await writer.drain()
+
+
+def _job_problem(job):
+    """Why ``job`` can't be run, or None if it is well formed"""
+    if not isinstance(job, dict) or 'id' not in job:
+        return "no job id"
+    op = job.get('op')
+    if op == 'cancel':
+        return None
+    if op not in ('complete', 'stream'):
+        return f"unknown op {op!r}"
+    if not isinstance(job.get('messages'), list):
+        return "no messages"
+    missing = [field for field in ('n', 'max_tokens', 'temperature', 'economy') if field not in job]
+    return f"missing {', '.join(missing)}" if missing else None
+
+
+def _failure(job_id, error):
+    return {
+        'id': job_id,
+        'error': 'circuit_open' if isinstance(error, CircuitOpen) else 'error',
+        'message': str(error) or type(error).__name__,
+        'status': getattr(error, 'status', None)
+    }
+
+
+def _raise(reply):
+    """Re-raise a worker's failure as the exception the in-process router would have raised"""
+    if reply['error'] == 'circuit_open':
+        raise CircuitOpen(reply['message'])
+    raise AITransportError(reply['message'], reply.get('status'))
+
+
+class _Relay:
+    """Stands in for the reply message in a worker: passes each streamed fragment back"""
+
+    def __init__(self, writer, job_id):
+        self.writer = writer
+        self.job_id = job_id
+
+    async def feed(self, delta):
+        await _send_drained(self.writer, {'id': self.job_id, 'delta': delta})
+
+
+class AIWorkerServer:
+    """Worker side: runs the jobs arriving on each connection concurrently"""
+
+    def __init__(self, router, transport):
+        self.router = router
+        self.transport = transport
+
+    async def handle(self, reader, writer):
+        tasks = {}
+        try:
+            while line := await reader.readline():
+                try:
+                    job = json.loads(line)
+                except ValueError:
+                    job = None
+                problem = _job_problem(job)
+                if problem:
+                    # Turn the one bad job down; the connection's other jobs carry on
+                    logger.warning(f"Rejected malformed AI job: {problem}")
+                    await _send_drained(writer, {
+                        'id': job.get('id') if isinstance(job, dict) else None,
+                        'error': 'error', 'message': f"Malformed AI job: {problem}", 'status': None
+                    })
+                    continue
+                job_id = job['id']
+                if job['op'] == 'cancel':
+                    task = tasks.get(job_id)
+                    if task is not None:
+                        task.cancel()
+                    continue
+                task = tasks[job_id] = asyncio.create_task(self.run(job, writer))
+                task.add_done_callback(lambda _, job_id=job_id: tasks.pop(job_id, None))
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"AI worker connection dropped: {e}")
+        except asyncio.CancelledError:
+            pass  # Worker shutting down
+        finally:
+            for task in list(tasks.values()):
+                task.cancel()
+            writer.close()
+
+    async def run(self, job, writer):
+        job_id = job['id']
+        usage = []
+        # Provider calls (and the hedges they start) report their tokens here
+        usage_sink.set(usage)
+        try:
+            if job['op'] == 'stream':
+                provider = self.router.stream_provider(job['economy'])
+                if provider is None:
+                    raise CircuitOpen("No healthy streaming AI provider")
+                await stream_through_breaker(
+                    provider, self.transport, _Relay(writer, job_id), job['messages'],
+                    job['max_tokens'], job['temperature'], job['economy']
+                )
+                reply = {'id': job_id, 'done': True}
+            else:
+                texts = await self.router.complete(
+                    self.transport, job['messages'], job['n'], job['max_tokens'], job['temperature'], job['economy']
+                )
+                reply = {'id': job_id, 'texts': texts, 'usage': usage}
+        except asyncio.CancelledError:
+            return  # The bot stopped waiting for it
+        except Exception as e:
+            reply = _failure(job_id, e)
+        if not writer.is_closing():
+            try:
+                await _send_drained(writer, reply)
+            except ConnectionError:
+                pass  # The bot went away; nobody is waiting for the reply
+
+
+async def serve_worker(path):
+    """Serve jobs on the Unix socket at ``path`` until the parent process goes away"""
+    parent = os.getppid()
+    router = router_from_env()
+    if os.path.exists(path):
+        os.unlink(path)
+    async with AITransport() as transport:
+        server = await asyncio.start_unix_server(AIWorkerServer(router, transport).handle, path, limit=MAX_LINE)
+        logger.info(f"AI worker {os.getpid()} serving {len(router.providers)} providers on {path}")
+        async with server:
+            # Don't outlive a bot that was killed without stopping its workers
+            while os.getppid() == parent:
+                await asyncio.sleep(2)
+
+
+def run_worker(path):
+    """Worker process entry point (``python ai_worker.py SOCKET_PATH``)"""
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    from bot_logging import setup_logging
+    setup_logging()
+    try:
+        asyncio.run(serve_worker(path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+class _WorkerConnection:
+    """The bot's connection to one worker, matching replies to waiting jobs by id"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        # job id -> Future (completions) or Queue (streams)
+        self.pending = {}
+        self.closed = False
+        self.task = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            while line := await self.reader.readline():
+                reply = json.loads(line)
+                target = self.pending.get(reply['id'])
+                if isinstance(target, asyncio.Queue):
+                    target.put_nowait(reply)
+                elif target is not None and not target.done():
+                    target.set_result(reply)
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Lost AI worker connection: {e}")
+        finally:
+            self.closed = True
+            self.writer.close()
+            lost = {'error': 'error', 'message': "AI worker connection lost"}
+            for job_id, target in self.pending.items():
+                if isinstance(target, asyncio.Queue):
+                    target.put_nowait(dict(lost, id=job_id))
+                elif not target.done():
+                    target.set_result(dict(lost, id=job_id))
+
+    async def send(self, message):
+        if self.closed:
+            raise AITransportError("AI worker connection lost")
+        try:
+            await _send_drained(self.writer, message)
+        except ConnectionError as e:
+            raise AITransportError(f"AI worker connection lost: {e}")
+
+    def cancel(self, job_id):
+        self.pending.pop(job_id, None)
+        if not self.closed:
+            _send(self.writer, {'id': job_id, 'op': 'cancel'})
+
+    async def close(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+
+class AIWorkerPool:
+    """
+    Bot side: starts the worker processes, restarts them if they die and
+    hands each provider call to the least busy one
+
+    ``complete`` and ``stream`` behave like :meth:`ProviderRouter.complete`
+    and :func:`stream_through_breaker`: a worker's CircuitOpen comes back as
+    CircuitOpen and any other failure as AITransportError. Token usage the
+    worker saw is counted here, against the calling command.
+    """
+
+    def __init__(self, workers=0, socket_dir=None, check_interval=1.0, min_backoff=1.0, max_backoff=60.0,
+                 stable_after=300.0):
+        """
+        Args:
+            workers: Worker processes to run (0 = call providers in this process)
+            socket_dir: Directory for the workers' sockets (the temp dir by default)
+            check_interval: Seconds between checks that every worker is up and connected
+            min_backoff, max_backoff: Restart delay bounds, doubling per crash
+            stable_after: Seconds a worker has to stay up for its backoff to reset
+        """
+        self.workers = workers
+        self.socket_dir = socket_dir or tempfile.gettempdir()
+        self.check_interval = check_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.paths = []
+        self.processes = [None] * workers
+        self.connections = [None] * workers
+        # Per worker: when it was last started, its current restart delay,
+        # when it may start again and how often it was restarted
+        self.started_at = [0.0] * workers
+        self.backoff = [0.0] * workers
+        self.next_start = [0.0] * workers
+        self.restarts = [0] * workers
+        self.ids = itertools.count(1)
+        self.task = None
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def start(self):
+        """Start the workers and the task that keeps them running and connected"""
+        if not self.enabled or self.task is not None:
+            return
+        self.paths = [
+            os.path.join(self.socket_dir, f"ai-worker-{os.getpid()}-{index}.sock") for index in range(self.workers)
+        ]
+        for index in range(self.workers):
+            self._spawn(index)
+        self.task = asyncio.create_task(self._supervise())
+        logger.info(f"Started {self.workers} AI worker processes")
+
+    def _spawn(self, index):
+        # A fresh interpreter rather than multiprocessing, so workers don't import the bot's main module
+        self.processes[index] = subprocess.Popen([sys.executable, os.path.abspath(__file__), self.paths[index]])
+        self.started_at[index] = time.monotonic()
+
+    def _schedule_restart(self, index, returncode):
+        now = time.monotonic()
+        if now - self.started_at[index] >= self.stable_after:
+            self.backoff[index] = 0.0
+        self.backoff[index] = min(self.max_backoff, max(self.min_backoff, self.backoff[index] * 2))
+        self.next_start[index] = now + self.backoff[index]
+        self.restarts[index] += 1
+        self.processes[index] = None
+        logger.warning(f"AI worker {index} exited with code {returncode}; restarting in {self.backoff[index]:g}s")
+
+    async def _supervise(self):
+        while True:
+            for index, process in enumerate(self.processes):
+                connection = self.connections[index]
+                if process is None:
+                    if time.monotonic() >= self.next_start[index]:
+                        self._spawn(index)
+                elif process.poll() is not None:
+                    if connection is not None:
+                        await connection.close()
+                    self.connections[index] = None
+                    self._schedule_restart(index, process.returncode)
+                elif connection is None or connection.closed:
+                    try:
+                        reader, writer = await asyncio.open_unix_connection(self.paths[index], limit=MAX_LINE)
+                    except OSError:
+                        continue  # Still starting up
+                    self.connections[index] = _WorkerConnection(reader, writer)
+            await asyncio.sleep(self.check_interval)
+
+    async def stop(self):
+        """Close the connections and stop the workers"""
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        for index, connection in enumerate(self.connections):
+            if connection is not None:
+                await connection.close()
+            self.connections[index] = None
+        running = [process for process in self.processes if process is not None]
+        for process in running:
+            process.terminate()
+        for process in running:
+            try:
+                await asyncio.to_thread(process.wait, 10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def _connection(self):
+        """The connected worker with the fewest jobs in flight"""
+        live = [connection for connection in self.connections if connection is not None and not connection.closed]
+        if not live:
+            raise AITransportError("No AI worker is running")
+        return min(live, key=lambda connection: len(connection.pending))
+
+    async def complete(self, messages, n=1, max_tokens=150, temperature=0.9, economy=False):
+        """Run a completion on a worker; returns the list of completion texts"""
+        connection = self._connection()
+        job_id = next(self.ids)
+        reply = connection.pending[job_id] = asyncio.get_running_loop().create_future()
+        try:
+            await connection.send({
+                'id': job_id, 'op': 'complete', 'messages': messages, 'n': n,
+                'max_tokens': max_tokens, 'temperature': temperature, 'economy': economy
+            })
+            reply = await reply
+        except asyncio.CancelledError:
+            connection.cancel(job_id)
+            raise
+        finally:
+            connection.pending.pop(job_id, None)
+        if 'error' in reply:
+            _raise(reply)
+        for prompt_tokens, completion_tokens in reply['usage']:
+            count_usage(prompt_tokens, completion_tokens)
+        return reply['texts']
+
+    async def stream(self, reply, messages, max_tokens=150, temperature=0.9, economy=False):
+        """Stream a completion from a worker into ``reply``"""
+        connection = self._connection()
+        job_id = next(self.ids)
+        fragments = connection.pending[job_id] = asyncio.Queue()
+        try:
+            await connection.send({
+                'id': job_id, 'op': 'stream', 'messages': messages, 'n': 1,
+                'max_tokens': max_tokens, 'temperature': temperature, 'economy': economy
+            })
+            while True:
+                message = await fragments.get()
+                if 'delta' in message:
+                    await reply.feed(message['delta'])
+                elif 'error' in message:
+                    _raise(message)
+                else:
+                    return
+        except asyncio.CancelledError:
+            connection.cancel(job_id)
+            raise
+        finally:
+            connection.pending.pop(job_id, None)
+
+    def stats(self):
+        """Jobs in flight per worker (None while it is not connected) and restarts per worker"""
+        return {
+            'jobs': [
+                len(connection.pending) if connection is not None and not connection.closed else None
+                for connection in self.connections
+            ],
+            'restarts': self.restarts
+        }
+
+
+if __name__ == "__main__":
+    run_worker(sys.argv[1])
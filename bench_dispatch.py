@@ -0,0 +1,74 @@
+"""
+Throughput benchmark for bot_simple's on_message front end
+
+Feeds synthetic messages straight into on_message and reports how many per
+second each kind is turned away: plain chat, other bots, and prefixed
+messages that aren't commands. Those paths finish without awaiting anything,
+so they are stepped directly with no event loop or gateway. Known commands
+are timed up to the name lookup only; what follows needs a live gateway.
+
+Usage:
+    python bench_dispatch.py [--messages 200000] [--min-rate 500000]
+
+Exits with status 1 when plain chat is dropped at fewer than --min-rate
+messages per second.
+"""
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+# Keep the import offline: no provider keys, no warm pool refills
+for name in ('OPENROUTER_API_KEY', 'AI_API_URL', 'AI_API_KEY', 'AI_PROVIDERS', 'ROAST_POOL_SIZE'):
+    os.environ.pop(name, None)
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import bot_simple
+
+HUMAN = SimpleNamespace(bot=False, id=1)
+OTHER_BOT = SimpleNamespace(bot=True, id=2)
+CHANNEL = SimpleNamespace(id=3)
+
+MESSAGES = {
+    'chat': SimpleNamespace(author=HUMAN, channel=CHANNEL, id=4, content="lol did anyone see the game last night"),
+    'bot': SimpleNamespace(author=OTHER_BOT, channel=CHANNEL, id=5, content=",roast everyone"),
+    'unknown command': SimpleNamespace(author=HUMAN, channel=CHANNEL, id=6, content=",, that's what she said"),
+}
+
+
+def rate(func, arg, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func(arg)
+    return count / (time.perf_counter() - start)
+
+
+def dispatch(message):
+    """Run on_message to completion; rejected messages never suspend"""
+    try:
+        bot_simple.on_message(message).send(None)
+    except StopIteration:
+        return
+    raise RuntimeError("message was not rejected up front")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--min-rate', type=float, default=None, help="fail if chat is dropped slower than this (msg/s)")
+    args = parser.parse_args()
+
+    rates = {kind: rate(dispatch, message, args.messages) for kind, message in MESSAGES.items()}
+    rates['known command (lookup)'] = rate(bot_simple.command_name, ",roast @someone", args.messages)
+
+    for kind, per_second in rates.items():
+        print(f"{kind:<24} {per_second:>12,.0f} msg/s")
+
+    if args.min_rate is not None and rates['chat'] < args.min_rate:
+        print(f"FAIL: chat dropped at {rates['chat']:,.0f} msg/s, below {args.min_rate:,.0f}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+"""
+Offline load test for bot_simple's command handlers
+
+Starts a local stand-in for the chat-completions endpoint (configurable
+latency, jitter and error rate, streaming supported), points the bot at it,
+and fires simulated commands at a fixed average rate: Poisson arrivals
+spread over a pool of fake users, channels and guilds. Each command runs
+through the bot's own before/after invoke hooks and its real handler; only
+Discord itself is faked (sends and edits just sleep for --send-latency, and
+users react to the bot's riddle and poll reactions with raw reaction events).
+
+Reports throughput, p50/p95/p99 latency overall and per command, how many
+AI answers came back versus fallbacks, and event-loop lag.
+
+Usage:
+    python bench_load.py [--rate 20] [--duration 30] [--ai-latency 0.8]
+                         [--ai-error-rate 0.05] [--mix roast:4,battle:1,poll:1]
+
+Exits with status 1 when --max-p95 is given and the overall p95 is above it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+DEFAULT_MIX = (
+    "roast:4,battle:1,riddle:1,poll:1,joke:2,story:1,compliment:1,truth:1,"
+    "roastme:1,flip:1,dice:1,stats:1,leaderboard:1"
+)
+MOCK_REPLY = "This is a stand-in reply from the load-test provider. It is long enough to stream in a few pieces."
+
+
+class MockProvider:
+    """aiohttp app answering OpenAI-style chat completions after a random delay"""
+
+    def __init__(self, latency, jitter, error_rate):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.economy = 0
+        self.runner = None
+
+    def delay(self):
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    async def handle(self, request):
+        from aiohttp import web
+
+        self.requests += 1
+        payload = await request.json()
+        if payload.get('model') == 'mock-economy':
+            self.economy += 1
+        if random.random() < self.error_rate:
+            self.errors += 1
+            await asyncio.sleep(self.delay() / 2)
+            return web.json_response({'error': 'injected failure'}, status=500)
+
+        prompt = payload['messages'][-1]['content']
+        text = MOCK_REPLY
+
+        if payload.get('stream'):
+            response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+            await response.prepare(request)
+            pieces = [text[i:i + 20] for i in range(0, len(text), 20)]
+            for piece in pieces:
+                await asyncio.sleep(self.delay() / len(pieces))
+                chunk = {'choices': [{'delta': {'content': piece}}]}
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await response.write(b"data: [DONE]\n\n")
+            return response
+
+        await asyncio.sleep(self.delay())
+        n = payload.get('n', 1)
+        return web.json_response({
+            'choices': [{'message': {'content': text}} for _ in range(n)],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': n * len(text) // 4}
+        })
+
+    async def start(self, port):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, '127.0.0.1', port).start()
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+class FakeUser:
+    def __init__(self, user_id, bot=False):
+        self.id = user_id
+        self.bot = bot
+        self.display_name = f"user{user_id}"
+        self.name = self.display_name
+        self.mention = f"<@{user_id}>"
+
+    def __str__(self):
+        return self.display_name
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class FakeChannel:
+    def __init__(self, harness, channel_id):
+        self.harness = harness
+        self.id = channel_id
+
+    async def send(self, content=None, **fields):
+        await self.harness.discord_call()
+        return FakeMessage(self.harness, self.harness.next_id(), self, self.harness.bot.user, content or '')
+
+
+class FakeMessage:
+    """A sent (or received) message; edits and reactions cost --send-latency"""
+
+    def __init__(self, harness, message_id, channel, author, content='', mentions=()):
+        self.harness = harness
+        self.id = message_id
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.mentions = list(mentions)
+        self.reactions = []
+
+    async def edit(self, **fields):
+        await self.harness.discord_call()
+        return self
+
+    async def add_reaction(self, emoji):
+        await self.harness.discord_call()
+        self.reactions.append(emoji)
+        self.harness.reaction_added(self, emoji)
+
+
+class _Typing:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeContext:
+    """The parts of commands.Context the handlers and hooks use"""
+
+    def __init__(self, harness, bot, command, message, guild):
+        self.harness = harness
+        self.bot = bot
+        self.command = command
+        self.cog = command.cog
+        self.message = message
+        self.author = message.author
+        self.channel = message.channel
+        self.guild = guild
+        self.command_failed = False
+
+    def typing(self):
+        return _Typing()
+
+    async def send(self, content=None, **fields):
+        await self.harness.discord_call()
+        return FakeMessage(self.harness, self.harness.next_id(), self.channel, self.bot.user, content or '')
+
+
+class Harness:
+    def __init__(self, bot_module, args):
+        self.bot_module = bot_module
+        self.bot = bot_module.bot
+        self.args = args
+        self.users = [FakeUser(1000 + index) for index in range(args.users)]
+        self.guilds = [FakeGuild(500 + index) for index in range(args.guilds)]
+        self.channels = [FakeChannel(self, 700 + index) for index in range(args.guilds * 3)]
+        self.ids = 10 ** 6
+        self.latencies = {}
+        self.errors = {}
+        self.lags = []
+
+    def next_id(self):
+        self.ids += 1
+        return self.ids
+
+    async def discord_call(self):
+        await asyncio.sleep(self.args.send_latency)
+
+    def reaction_added(self, message, emoji):
+        # Someone asks for the riddle answer or votes on the poll a little later
+        payload = SimpleNamespace(
+            message_id=message.id, channel_id=message.channel.id, user_id=random.choice(self.users).id, emoji=emoji
+        )
+        asyncio.get_running_loop().call_later(
+            self.args.reaction_delay, lambda: asyncio.create_task(self.bot_module.on_raw_reaction_add(payload))
+        )
+
+    def command_args(self, name, author):
+        others = [user for user in self.users if user is not author]
+        other = random.choice(others)
+        if name in ('battle', 'compare'):
+            return (author, other), {}
+        if name == 'roast':
+            return (), {'target': other.display_name}
+        if name in ('compliment', 'rate', 'verse', 'truth', 'therapy', 'fortune', 'advice', 'challenge', 'stats'):
+            return (other,), {}
+        if name == 'poll':
+            return (), {'question_and_options': "Best snack? | Chips | Fruit | Both"}
+        if name == 'choose':
+            return (), {'options': "pizza | tacos | curry"}
+        if name == 'dice':
+            return ("2d6",), {}
+        return (), {}
+
+    async def run_command(self, name):
+        author = random.choice(self.users)
+        guild_index = random.randrange(len(self.guilds))
+        channel = self.channels[guild_index * 3 + random.randrange(3)]
+        content = f"{self.bot.command_prefix}{name}"
+        message = FakeMessage(self, self.next_id(), channel, author, content)
+
+        start = time.perf_counter()
+        # Same front end as a real message, minus the gateway
+        if self.bot_module.command_name(content) is None:
+            raise RuntimeError(f"{name} is not a known command")
+        await self.bot_module.ensure_command_loaded(name)
+        command = self.bot.get_command(name)
+        ctx = FakeContext(self, self.bot, command, message, self.guilds[guild_index])
+        args, kwargs = self.command_args(name, author)
+
+        await self.bot._before_invoke(ctx)
+        try:
+            if command.cog is not None:
+                await command.callback(command.cog, ctx, *args, **kwargs)
+            else:
+                await command.callback(ctx, *args, **kwargs)
+        except Exception as e:
+            ctx.command_failed = True
+            self.errors[name] = self.errors.get(name, 0) + 1
+            if self.args.verbose:
+                print(f"{name} failed: {e!r}", file=sys.stderr)
+        finally:
+            await self.bot._after_invoke(ctx)
+        self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+
+    async def chat(self):
+        """Plain chat goes through on_message and should be dropped straight away"""
+        message = FakeMessage(self, self.next_id(), random.choice(self.channels), random.choice(self.users), "just chatting")
+        await self.bot_module.on_message(message)
+
+    async def watch_loop_lag(self, interval=0.05):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    async def run(self, mix):
+        names, weights = zip(*mix.items())
+        watcher = asyncio.create_task(self.watch_loop_lag())
+        tasks = set()
+        start = time.perf_counter()
+        deadline = start + self.args.duration
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(random.expovariate(self.args.rate))
+            if random.random() < self.args.chat:
+                task = asyncio.create_task(self.chat())
+            else:
+                task = asyncio.create_task(self.run_command(random.choices(names, weights)[0]))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks, timeout=self.args.drain)
+        elapsed = time.perf_counter() - start
+        watcher.cancel()
+        return elapsed
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.strip().partition(':')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def configure_environment(args, port, workdir):
+    """Point the bot at the mock provider only, with throwaway state and quiet logs"""
+    for name in ('OPENROUTER_API_KEY', 'AI_API_URL', 'AI_API_KEY', 'AI_CACHE_PATH', 'RATE_LIMIT_STATE',
+                 'SESSIONS_DB_PATH', 'USAGE_DB_PATH', 'AI_GUILD_QUOTAS', 'AI_GUILD_DAILY_MAX_TOKENS'):
+        os.environ.pop(name, None)
+    os.environ['LOADTEST_AI_KEY'] = 'offline'
+    os.environ['AI_PROVIDERS'] = json.dumps([{
+        'name': 'mock', 'url': f'http://127.0.0.1:{port}/v1/chat/completions',
+        'api_key_env': 'LOADTEST_AI_KEY', 'model': 'mock', 'economy_model': 'mock-economy', 'adapter': 'openai'
+    }])
+    os.environ['AI_GUILD_DAILY_TOKENS'] = str(args.guild_quota)
+    os.environ['STATS_DB_PATH'] = os.path.join(workdir, 'stats.db')
+    os.environ['METRICS_PORT'] = '0'
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+    os.environ['AI_STREAMING'] = '1' if args.streaming else '0'
+    os.environ['AI_WORKERS'] = str(args.ai_workers)
+    os.environ['AI_WORKER_SOCKET_DIR'] = workdir
+    if not args.rate_limits:
+        for scope in ('USER', 'CHANNEL', 'GUILD'):
+            os.environ[f'RATE_LIMIT_{scope}'] = '0'
+
+
+async def main_async(args):
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix='bench_load_')
+    configure_environment(args, port, workdir)
+
+    import bot_simple
+    import metrics
+    from ai_service import ai_transport, ai_workers, roast_pool
+    from ai_budget import usage_ledger
+    from sessions import session_registry
+    from stats_store import roast_stats
+
+    provider = MockProvider(args.ai_latency, args.ai_jitter, args.ai_error_rate)
+    await provider.start(port)
+    bot_simple.bot._connection.user = FakeUser(1, bot=True)
+    harness = Harness(bot_simple, args)
+
+    async with ai_transport:
+        ai_workers.start()
+        roast_pool.start()
+        roast_stats.start()
+        session_registry.start(bot_simple.bot)
+        usage_ledger.start()
+        try:
+            await bot_simple.load_extensions()
+            # Let the worker processes come up before the clock starts
+            for _ in range(100):
+                if None not in ai_workers.stats()['jobs']:
+                    break
+                await asyncio.sleep(0.1)
+            elapsed = await harness.run(parse_mix(args.mix))
+        finally:
+            await roast_pool.stop()
+            await ai_workers.stop()
+            await roast_stats.stop()
+            await session_registry.stop()
+            await usage_ledger.stop()
+            await provider.stop()
+
+    all_latencies = [value for values in harness.latencies.values() for value in values]
+    completed = len(all_latencies)
+    print(f"{completed:,} commands finished in {elapsed:.1f}s = {completed / elapsed:.1f} commands/s "
+          f"(offered {args.rate * (1 - args.chat):.1f}/s for {args.duration:g}s, plus {args.chat:.0%} chat)")
+    print(f"{'command':<12} {'runs':>6} {'errors':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'AI ok':>6} {'fallbk':>6}")
+    rows = sorted(harness.latencies.items(), key=lambda item: -len(item[1]))
+    for name, values in [*rows, ('ALL', all_latencies)]:
+        outcomes = {}
+        for (command, outcome), count in metrics.AI_REQUESTS.values.items():
+            if name == 'ALL' or command == name:
+                outcomes[outcome] = outcomes.get(outcome, 0) + count
+        answered = sum(outcomes.get(outcome, 0) for outcome in metrics.ANSWERED)
+        errors = sum(harness.errors.values()) if name == 'ALL' else harness.errors.get(name, 0)
+        print(f"{name:<12} {len(values):>6} {errors:>6} "
+              f"{percentile(values, 0.5) * 1000:>6.0f}ms {percentile(values, 0.95) * 1000:>6.0f}ms "
+              f"{percentile(values, 0.99) * 1000:>6.0f}ms {answered:>6} {sum(outcomes.values()) - answered:>6}")
+    print(f"mock provider: {provider.requests:,} requests ({provider.economy:,} on the economy model), "
+          f"{provider.errors:,} injected errors")
+    print(f"event loop lag: p50 {percentile(harness.lags, 0.5) * 1000:.1f}ms  "
+          f"p99 {percentile(harness.lags, 0.99) * 1000:.1f}ms  max {max(harness.lags, default=0) * 1000:.1f}ms")
+
+    overall_p95 = percentile(all_latencies, 0.95)
+    if args.max_p95 is not None and overall_p95 > args.max_p95:
+        print(f"FAIL: p95 {overall_p95:.2f}s exceeds {args.max_p95:.2f}s")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rate', type=float, default=20, help="messages per second (commands and chat)")
+    parser.add_argument('--duration', type=float, default=30, help="seconds to keep sending")
+    parser.add_argument('--drain', type=float, default=60, help="seconds to wait for in-flight commands at the end")
+    parser.add_argument('--chat', type=float, default=0.0, help="share of messages that are plain chat")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="command:weight list")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--guilds', type=int, default=10)
+    parser.add_argument('--ai-latency', type=float, default=0.8, help="mean mock provider latency (s)")
+    parser.add_argument('--ai-jitter', type=float, default=0.4, help="+/- spread around the mean (s)")
+    parser.add_argument('--ai-error-rate', type=float, default=0.02, help="share of provider calls answered with a 500")
+    parser.add_argument('--send-latency', type=float, default=0.05, help="simulated Discord REST latency (s)")
+    parser.add_argument('--reaction-delay', type=float, default=1.0, help="seconds before users react to riddles and polls")
+    parser.add_argument('--streaming', action='store_true', help="stream long replies (AI_STREAMING=1)")
+    parser.add_argument('--rate-limits', action='store_true', help="keep the RATE_LIMIT_* limits on")
+    parser.add_argument('--ai-workers', type=int, default=0,
+                        help="run provider calls in this many worker processes (AI_WORKERS)")
+    parser.add_argument('--guild-quota', type=int, default=0,
+                        help="daily tokens per guild before the economy model is used (0 = no quota)")
+    parser.add_argument('--max-p95', type=float, default=None, help="fail if the overall p95 (s) is above this")
+    parser.add_argument('--verbose', action='store_true', help="print command failures")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Cold-start benchmark for bot_simple.py
+
+Measures, in a fresh interpreter per run, how long it takes to import the
+bot, load every command module and read the fallback corpus.
+
+Time to on_ready and to the first handled command need a live gateway.
+--live starts the real bot (DISCORD_BOT_TOKEN must be set) and reads those
+milestones from its "Startup: ..." log lines. It waits until someone sends
+the bot a command or the timeout runs out.
+
+Usage:
+    python bench_startup.py [--runs 5] [--max-import 2.0] [--live 120]
+
+Exits with status 1 when the median import time exceeds --max-import.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import threading
+
+PROBE = """
+import asyncio, json, time
+start = time.perf_counter()
+import bot_simple
+imported = time.perf_counter() - start
+
+async def load_all():
+    begin = time.perf_counter()
+    await bot_simple.load_extensions()
+    return time.perf_counter() - begin
+
+extensions = asyncio.run(load_all())
+
+import fallbacks
+begin = time.perf_counter()
+fallbacks.store()
+corpus = time.perf_counter() - begin
+
+print(json.dumps({'import': imported, 'extensions': extensions, 'corpus': corpus}))
+"""
+STARTUP_LINE = re.compile(r"Startup: (.+?) after ([\d.]+)s")
+
+
+def run_probe():
+    env = dict(os.environ)
+    # Keep the probe offline: no provider keys, no warm pool refills
+    for name in ('OPENROUTER_API_KEY', 'AI_API_URL', 'AI_API_KEY', 'AI_PROVIDERS', 'ROAST_POOL_SIZE'):
+        env.pop(name, None)
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_live(timeout):
+    """Run the real bot until its first handled command (or ``timeout`` seconds); milestone -> seconds"""
+    bot = subprocess.Popen(
+        [sys.executable, 'bot_simple.py'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=dict(os.environ, LOG_FORMAT='text'), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    # Stopping the bot ends the read loop below even if it has gone quiet
+    timer = threading.Timer(timeout, bot.terminate)
+    timer.start()
+    milestones = {}
+    try:
+        for line in bot.stdout:
+            match = STARTUP_LINE.search(line)
+            if match:
+                milestones[match.group(1)] = float(match.group(2))
+                if match.group(1) == 'first command':
+                    break
+    finally:
+        timer.cancel()
+        bot.terminate()
+        bot.wait()
+    return milestones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-import', type=float, default=None, help="fail if the median import time (s) is above this")
+    parser.add_argument('--live', type=float, metavar='SECONDS', default=None,
+                        help="also run the real bot and report time to on_ready and to the first command")
+    args = parser.parse_args()
+    if args.live is not None and not os.getenv('DISCORD_BOT_TOKEN'):
+        parser.error("--live needs DISCORD_BOT_TOKEN")
+
+    samples = [run_probe() for _ in range(args.runs)]
+    for phase in ('import', 'extensions', 'corpus'):
+        values = [sample[phase] * 1000 for sample in samples]
+        print(f"{phase:<11} median {statistics.median(values):8.1f}ms   min {min(values):8.1f}ms   max {max(values):8.1f}ms")
+
+    if args.live is not None:
+        milestones = run_live(args.live)
+        for milestone in ('ready', 'first command'):
+            if milestone in milestones:
+                print(f"{milestone:<14} {milestones[milestone] * 1000:8.1f}ms after process start")
+            else:
+                print(f"{milestone:<14} not reached within {args.live:g}s")
+
+    median_import = statistics.median(sample['import'] for sample in samples)
+    if args.max_import is not None and median_import > args.max_import:
+        print(f"FAIL: median import {median_import:.2f}s exceeds {args.max_import:.2f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else on a record came in through ``extra=``
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+command_logger = logging.getLogger('commands')
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any ``extra`` fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most ``burst`` records per message template every ``interval`` seconds
+
+    Records are keyed by logger and unformatted message, so a busy
+    ``"... %s"`` line is limited as a whole whatever its arguments. Warnings
+    and errors always pass. How many records were dropped is attached to the
+    next one let through as ``suppressed``.
+    """
+
+    def __init__(self, burst=20, interval=10.0, max_keys=1024):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.max_keys = max_keys
+        # (logger, template) -> [window start, records let through, records dropped]
+        self.windows = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.burst <= 0:
+            return True
+        key = (record.name, record.msg)
+        window = self.windows.get(key)
+        if window is None or record.created - window[0] >= self.interval:
+            if window is None and len(self.windows) >= self.max_keys:
+                self.windows.clear()
+            if window and window[2]:
+                record.suppressed = window[2]
+            window = self.windows[key] = [record.created, 0, 0]
+        if window[1] >= self.burst:
+            window[2] += 1
+            return False
+        window[1] += 1
+        return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue records unformatted so %-style formatting happens on the listener thread"""
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level=None, fmt=None):
+    """
+    Send all logging through a queue drained by a background thread
+
+    The event loop only filters a record and puts it on the queue; formatting
+    and writing to stdout happen on the listener thread. Replaces any
+    handlers already on the root logger.
+
+    Args:
+        level: Root log level (default ``LOG_LEVEL`` or INFO)
+        fmt: ``json`` for one JSON object per line, ``text`` for plain lines
+            (default ``LOG_FORMAT`` or json)
+
+    Returns:
+        The started listener; it is also stopped (and flushed) at exit
+    """
+    level = level or os.getenv('LOG_LEVEL', 'INFO').upper()
+    fmt = fmt or os.getenv('LOG_FORMAT', 'json')
+
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    handler = _DeferredQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter(
+        burst=int(os.getenv('LOG_RATE_LIMIT', '20')),
+        interval=float(os.getenv('LOG_RATE_INTERVAL', '10'))
+    ))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, output)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def start_command_timer(ctx):
+    """Mark when ``ctx``'s command started, for :func:`log_command`"""
+    ctx.started_at = time.perf_counter()
+
+
+def log_command(ctx, **fields):
+    """
+    Log one structured record for a finished command
+
+    Carries the command, guild, channel and user ids, the run time since
+    :func:`start_command_timer` and whether it failed, plus ``fields``.
+    """
+    started = getattr(ctx, 'started_at', None)
+    duration_ms = round((time.perf_counter() - started) * 1000, 1) if started is not None else None
+    name = ctx.command.qualified_name if ctx.command else None
+    command_logger.info(
+        "%s finished in %sms", name, duration_ms,
+        extra={
+            'event': 'command',
+            'command': name,
+            'guild_id': ctx.guild.id if ctx.guild else None,
+            'channel_id': ctx.channel.id,
+            'user_id': ctx.author.id,
+            'duration_ms': duration_ms,
+            'failed': ctx.command_failed,
+            **fields
+        }
+    )
@@ -1,13 +1,15 @@
 import discord
 from discord.ext import commands
-import random
 import os
 import logging
-import requests
-import json
+import asyncio
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from ai_transport import AITransport
+from ai_concurrency import gather_with_deadline
+from bot_logging import log_command, setup_logging, start_command_timer
+
+# Set up logging (written from a background thread, see bot_logging)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Create bot with intents
@@ -18,6 +20,9 @@ bot = commands.Bot(command_prefix=',', intents=intents)
 # Initialize AI settings (OpenRouter)
 openrouter_key = os.getenv('OPENROUTER_API_KEY')
 
+# Shared async connection pool for every AI call (opened at startup, closed on shutdown)
+ai_transport = AITransport()
+
 if openrouter_key:
     logger.info("OpenRouter client initialized for AI-powered roasts")
 else:
@@ -37,39 +42,26 @@ fallback_roasts = [
     "{target}, existence itself cringes when you enter a room."
 ]
 
+# Seconds a multi-generation command (battle) waits before filling slow slots with fallbacks
+MULTI_GENERATION_DEADLINE = 8
+
+def fallback_roast(target_name):
+    """Pick a built-in roast for the target"""
+    import random as rnd
+    roast_template = rnd.choice(fallback_roasts)
+    return roast_template.format(target=target_name)
+
 async def make_ai_request(prompt, system_prompt, max_tokens=150, temperature=0.9):
     """Helper function to make AI requests via OpenRouter"""
     if not openrouter_key:
         return None
     
     try:
-        headers = {
-            'Authorization': f'Bearer {openrouter_key}',
-            'Content-Type': 'application/json'
-        }
-        
-        payload = {
-            "model": "openai/gpt-4o",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": max_tokens,
-            "temperature": temperature
-        }
-        
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            return data['choices'][0]['message']['content'].strip()
-        else:
-            raise Exception(f"API error: {response.status_code}")
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        return await ai_transport.chat_completion(openrouter_key, messages, max_tokens=max_tokens, temperature=temperature)
             
     except Exception as e:
         logger.warning(f"AI request failed: {e}")
@@ -77,15 +69,8 @@ async def make_ai_request(prompt, system_prompt, max_tokens=150, temperature=0.9
 
 async def get_ai_roast(target_name):
     """Get a dark, unhinged AI-generated roast"""
-    if not openrouter_key:
-        # Use fallback if no AI
-        import random as rnd
-        roast_template = rnd.choice(fallback_roasts)
-        return roast_template.format(target=target_name)
-    
-    try:
-        # Ultra-dark, unhinged roast prompt
-        prompt = f"""Create an absolutely savage, dark humor roast for someone named '{target_name}'. 
+    # Ultra-dark, unhinged roast prompt
+    prompt = f"""Create an absolutely savage, dark humor roast for someone named '{target_name}'. 
         
 Make it:
 - Brutally unhinged and creative
@@ -99,42 +84,15 @@ Rules: No slurs, no threats, no real-world tragedies. Just pure psychological wa
 Be completely unhinged but clever. Make it so brutal that even the AI feels bad for generating it.
 
 Target: {target_name}"""
-        
-        headers = {
-            'Authorization': f'Bearer {openrouter_key}',
-            'Content-Type': 'application/json'
-        }
-        
-        payload = {
-            "model": "openai/gpt-4o",
-            "messages": [
-                {"role": "system", "content": "You are a savage roast comedian with no filter. Generate the most brutal, unhinged roasts possible while staying clever and avoiding actual harm."},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 200,
-            "temperature": 0.95
-        }
-        
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            roast = data['choices'][0]['message']['content'].strip()
-            logger.info(f"Generated AI roast for {target_name}")
-            return roast
-        else:
-            raise Exception(f"API error: {response.status_code}")
-        
-    except Exception as e:
-        logger.warning(f"AI roast failed: {e}, using fallback")
-        import random as rnd
-        roast_template = rnd.choice(fallback_roasts)
-        return roast_template.format(target=target_name)
+    system_prompt = "You are a savage roast comedian with no filter. Generate the most brutal, unhinged roasts possible while staying clever and avoiding actual harm."
+
+    roast = await make_ai_request(prompt, system_prompt, 200, 0.95)
+    if roast:
+        logger.debug("Generated AI roast for %s", target_name)
+        return roast
+
+    # Use fallback if no AI or the request failed
+    return fallback_roast(target_name)
 
 @bot.event
 async def on_ready():
@@ -145,19 +103,24 @@ async def on_ready():
 
 @bot.event
 async def on_message(message):
-    if message.author == bot.user:
+    # Drop chat and bot messages (us included) before logging or building a Context
+    if message.author.bot or not message.content.startswith(','):
         return
     
-    logger.info(f"Received message: '{message.content}' from {message.author}")
-    
-    if message.content.startswith(','):
-        await bot.process_commands(message)
+    logger.debug("Message %s from %s in %s", message.id, message.author.id, message.channel.id)
+    await bot.process_commands(message)
+
+@bot.before_invoke
+async def time_command(ctx):
+    start_command_timer(ctx)
+
+@bot.after_invoke
+async def log_command_timing(ctx):
+    log_command(ctx)
 
 @bot.command()
 async def roast(ctx, target: discord.Member = None):
     """Generate a savage AI roast for someone"""
-    logger.info(f"Roast command executed by {ctx.author}")
-    
     if target:
         target_name = target.display_name
         mention = target.mention
@@ -176,8 +139,6 @@ async def roast(ctx, target: discord.Member = None):
 @bot.command()
 async def battle(ctx, user1: discord.Member = None, user2: discord.Member = None):
     """Epic roast battle between two users"""
-    logger.info(f"Battle command executed by {ctx.author}")
-    
     if not user1 or not user2:
         await ctx.send("🔥 Usage: `,battle @user1 @user2` - Let the roasting commence!")
         return
@@ -187,8 +148,12 @@ async def battle(ctx, user1: discord.Member = None, user2: discord.Member = None
         return
     
     async with ctx.typing():
-        roast1 = await get_ai_roast(user1.display_name)
-        roast2 = await get_ai_roast(user2.display_name)
+        # Both roasts are generated at once; a slot that misses the deadline gets a built-in roast
+        roast1, roast2 = await gather_with_deadline(
+            [get_ai_roast(user1.display_name), get_ai_roast(user2.display_name)],
+            MULTI_GENERATION_DEADLINE,
+            [lambda: fallback_roast(user1.display_name), lambda: fallback_roast(user2.display_name)]
+        )
     
     # Determine winner (random for drama)
     import random as rnd
@@ -210,5 +175,13 @@ if __name__ == "__main__":
         logger.error("DISCORD_BOT_TOKEN environment variable is required")
         exit(1)
     
+    async def main():
+        async with ai_transport:
+            async with bot:
+                await bot.start(token)
+    
     logger.info("Starting simplified bot...")
-    bot.run(token)
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Bot shutdown requested by user")
\ No newline at end of file
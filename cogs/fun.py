@@ -0,0 +1,114 @@
+import logging
+import random
+
+import discord
+from discord.ext import commands
+
+import fallbacks
+from ai_service import prompt_request, stream_prompt_request
+from sessions import RIDDLE_DURATION, RIDDLE_REACTION, RiddleSession, session_registry
+
+logger = logging.getLogger(__name__)
+
+STORY_PROMPTS = [
+    "Write a short, entertaining story about an unlikely friendship",
+    "Create a funny story about someone's worst day that turns out great",
+    "Tell a tale about a magical object found in an ordinary place",
+    "Write about someone who discovers they have a useless superpower",
+    "Create a story about a mix-up that leads to an adventure"
+]
+
+# Joke prompt -> fallback tag of the same style
+JOKE_TYPES = {
+    "Tell me a clever pun joke": 'pun',
+    "Give me a witty one-liner": 'one-liner',
+    "Create a funny observational joke": 'observational',
+    "Tell me a joke with unexpected wordplay": 'wordplay',
+    "Give me a clever dad joke with a twist": 'dad'
+}
+
+
+class Fun(commands.Cog):
+    """General fun: stories, jokes, advice and riddles"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command()
+    async def story(self, ctx):
+        """Generate a random AI story"""
+        async with ctx.typing():
+            def render(text):
+                embed = discord.Embed(title="📚 AI STORY TIME 📚", color=0x9370DB)
+                embed.add_field(name="Today's Tale", value=text, inline=False)
+                embed.set_footer(text="Generated fresh just for you")
+                return {'embed': embed}
+
+            reply, story = await stream_prompt_request(ctx, 'story', render, premise=random.choice(STORY_PROMPTS))
+
+        if not story:
+            story = fallbacks.pick('story')
+
+        await reply.finish(story)
+
+    @commands.command()
+    async def joke(self, ctx):
+        """Get a clever AI joke"""
+        async with ctx.typing():
+            style = random.choice(list(JOKE_TYPES))
+            joke = await prompt_request('joke', style=style)
+
+        if not joke:
+            joke = fallbacks.pick('joke', (JOKE_TYPES[style],))
+
+        await ctx.send(f"😄 **JOKE TIME** 😄\n{joke}")
+
+    @commands.command()
+    async def advice(self, ctx, target: discord.Member = None):
+        """Actually helpful life advice"""
+        member = target or ctx.author
+        target_name = member.display_name
+        mention = member.mention
+
+        async with ctx.typing():
+            advice = await prompt_request('advice', target=target_name)
+
+        if not advice:
+            advice = fallbacks.pick('advice')
+
+        embed = discord.Embed(title="🌟 LIFE ADVICE 🌟", color=0x32CD32)
+        embed.add_field(name="For", value=mention, inline=False)
+        embed.add_field(name="Wisdom", value=advice, inline=False)
+        embed.set_footer(text="Sometimes we all need encouragement")
+
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def riddle(self, ctx):
+        """Get a brain-teasing riddle"""
+        async with ctx.typing():
+            content = await prompt_request('riddle')
+
+        if content:
+            if "ANSWER:" in content:
+                parts = content.split("ANSWER:")
+                riddle_text = parts[0].replace("RIDDLE:", "").strip()
+                answer = parts[1].strip()
+                riddle_data = {"riddle": riddle_text, "answer": answer}
+            else:
+                riddle_data = {"riddle": content, "answer": "Think about it!"}
+        else:
+            riddle_data = fallbacks.pick('riddle')
+
+        embed = discord.Embed(title="🧩 RIDDLE TIME 🧩", color=0xFFD700)
+        embed.add_field(name="Challenge", value=riddle_data["riddle"], inline=False)
+        embed.add_field(name="Think you know?", value="React with 🤔 if you want the answer!", inline=False)
+
+        message = await ctx.send(embed=embed)
+        # The answer is revealed from the reaction event, nothing waits here
+        session_registry.open(message.id, RiddleSession(message, ctx.channel, riddle_data["answer"]), RIDDLE_DURATION)
+        await message.add_reaction(RIDDLE_REACTION)
+
+
+async def setup(bot):
+    await bot.add_cog(Fun(bot))
@@ -0,0 +1,348 @@
+import logging
+import os
+import random
+import time
+
+import discord
+from discord.ext import commands
+
+import fallbacks
+from ai_concurrency import gather_with_deadline
+from ai_service import (
+    MULTI_GENERATION_DEADLINE, fallback_roast, get_ai_roast, prompt_request, roast_pool,
+    stream_prompt_request
+)
+from ai_stream import ProgressiveMessage
+from stats_store import GLOBAL, roast_stats
+
+logger = logging.getLogger(__name__)
+
+RATING_DESCRIPTIONS = {
+    1: "Barely worth the effort. Even my algorithms feel bad.",
+    2: "Low-hanging fruit. Too easy, no sport in it.",
+    3: "Mildly roastable. Like burnt toast - disappointing.",
+    4: "Average target. Standard emotional damage potential.",
+    5: "Decent roast material. Room for creativity.",
+    6: "Good target. Multiple angles of attack available.",
+    7: "High roastability. Rich material to work with.",
+    8: "Premium roast candidate. Chef's choice material.",
+    9: "Elite roasting territory. Maximum damage potential.",
+    10: "Legendary roast target. The stuff of roasting dreams."
+}
+
+
+# Leaderboard sections: title and ranked metric
+LEADERBOARDS = (
+    ("💀 Most Roasted", 'roasts_received'),
+    ("⚔️ Most Battle Wins", 'battle_wins'),
+    ("🔥 Most Active Roasters", 'roasts_given')
+)
+# Seconds a built leaderboard is reused before it is rebuilt
+LEADERBOARD_TTL = float(os.getenv('LEADERBOARD_TTL', '30'))
+
+
+def member_or_author(ctx, target):
+    """Display name and mention of the target, defaulting to whoever ran the command"""
+    member = target or ctx.author
+    return member.display_name, member.mention
+
+
+def count_roast(ctx, *targets):
+    """Count a roast by whoever ran the command, received by each target member"""
+    guild_id = ctx.guild.id if ctx.guild else None
+    roast_stats.record(guild_id, ctx.author.id, 'roasts_given')
+    for member in targets:
+        roast_stats.record(guild_id, member.id, 'roasts_received')
+
+
+class Roasting(commands.Cog):
+    """Roasts, battles and the other roast-flavoured commands"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        # Leaderboard scope -> (expiry, embed); expired entries are dropped whenever one is added
+        self.leaderboards = {}
+
+    @commands.command()
+    async def roast(self, ctx, *, target=None):
+        """Dark, unhinged AI-powered roast command"""
+        # Determine target
+        if target:
+            if ctx.message.mentions:
+                target_name = ctx.message.mentions[0].display_name
+                mention_tag = ctx.message.mentions[0].mention
+            else:
+                target_name = target
+                mention_tag = None
+        else:
+            target_name = ctx.author.display_name
+            mention_tag = ctx.author.mention
+
+        # Show typing indicator for dramatic effect
+        async with ctx.typing():
+            # Get AI-powered dark roast
+            roast_text = await get_ai_roast(target_name)
+
+        # Send response
+        if mention_tag and target:
+            response = f"🔥 {mention_tag} {roast_text}"
+        else:
+            response = f"🔥 {roast_text}"
+
+        await ctx.send(response)
+        count_roast(ctx, *(ctx.message.mentions[:1] if target else [ctx.author]))
+
+    @commands.command()
+    async def battle(self, ctx, user1: discord.Member = None, user2: discord.Member = None):
+        """AI judges a roast battle between two users"""
+        if not user1 or not user2:
+            await ctx.send("🔥 Usage: `,battle @user1 @user2` - Let AI judge who gets roasted harder!")
+            return
+
+        if user1 == user2:
+            await ctx.send("🔥 You can't battle yourself... that's just sad.")
+            return
+
+        async with ctx.typing():
+            # Generate both roasts at once; a slot that fails or misses the deadline gets a built-in roast
+            names = [user1.display_name, user2.display_name]
+            roast1, roast2 = await gather_with_deadline(
+                [get_ai_roast(name) for name in names],
+                MULTI_GENERATION_DEADLINE,
+                [lambda name=name: fallback_roast(name) for name in names]
+            )
+
+            # AI judges the winner
+            winner = random.choice([user1, user2])
+
+        embed = discord.Embed(title="⚔️ ROAST BATTLE RESULTS ⚔️", color=0xFF0000)
+        embed.add_field(name=f"🔥 {user1.display_name}", value=roast1, inline=False)
+        embed.add_field(name=f"🔥 {user2.display_name}", value=roast2, inline=False)
+        embed.add_field(name="🏆 WINNER", value=f"{winner.mention} survives with less emotional damage!", inline=False)
+
+        await ctx.send(embed=embed)
+        count_roast(ctx, user1, user2)
+        for member in (user1, user2):
+            roast_stats.record(ctx.guild.id if ctx.guild else None, member.id, 'battles')
+        roast_stats.record(ctx.guild.id if ctx.guild else None, winner.id, 'battle_wins')
+
+    @commands.command()
+    async def challenge(self, ctx, target: discord.Member = None):
+        """Challenge someone to a roast battle"""
+        if not target:
+            await ctx.send("🔥 Usage: `,challenge @user` - Challenge someone to a roast-off!")
+            return
+
+        if target == ctx.author:
+            await ctx.send("🔥 Challenging yourself? That's the most pathetic thing I've seen today.")
+            return
+
+        await ctx.send(f"🔥 {ctx.author.mention} has challenged {target.mention} to a roast battle! "
+                       f"Will {target.display_name} accept this digital duel of destruction? "
+                       f"Use `,battle {ctx.author.mention} {target.mention}` to settle this!")
+
+    @commands.command(name='random')
+    async def random_roast(self, ctx):
+        """Get a random savage roast"""
+        random_targets = ["humanity", "existence", "the universe", "Monday mornings", "your life choices"]
+        target = random.choice(random_targets)
+
+        async with ctx.typing():
+            roast = await get_ai_roast(target)
+
+        await ctx.send(f"🎲 Random roast: {roast}")
+        count_roast(ctx)
+
+    @commands.command()
+    async def compliment(self, ctx, target: discord.Member = None):
+        """Give a backhanded AI compliment"""
+        target_name, mention = member_or_author(ctx, target)
+
+        async with ctx.typing():
+            compliment = await prompt_request('compliment', target=target_name)
+
+            if not compliment:
+                compliment = fallbacks.pick('compliment')
+
+        await ctx.send(f"💐 {mention} {compliment}")
+        count_roast(ctx, target or ctx.author)
+
+    @commands.command()
+    async def rate(self, ctx, target: discord.Member = None):
+        """Rate someone's roastability"""
+        target_name, mention = member_or_author(ctx, target)
+
+        # Generate random rating with personality
+        rating = random.randint(1, 10)
+        description = RATING_DESCRIPTIONS[rating]
+
+        embed = discord.Embed(title="📊 ROASTABILITY RATING", color=0xFF4500)
+        embed.add_field(name="Target", value=mention, inline=True)
+        embed.add_field(name="Rating", value=f"{rating}/10 🔥", inline=True)
+        embed.add_field(name="Analysis", value=description, inline=False)
+
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def stats(self, ctx, target: discord.Member = None):
+        """Show roasting statistics for you or someone else in this server"""
+        member = target or ctx.author
+        numbers = await roast_stats.user_stats(ctx.guild.id if ctx.guild else None, member.id)
+
+        embed = discord.Embed(title="📈 ROASTING STATISTICS", description=member.mention, color=0x00FF00)
+        embed.add_field(name="🔥 Roasts Given", value=f"{numbers['roasts_given']:,}", inline=True)
+        embed.add_field(name="💀 Times Roasted", value=f"{numbers['roasts_received']:,}", inline=True)
+        embed.add_field(name="⚔️ Battles Won", value=f"{numbers['battle_wins']:,} / {numbers['battles']:,}", inline=True)
+        embed.add_field(name="🤖 Commands Used", value=f"{numbers['commands']:,}", inline=True)
+        embed.add_field(name="🏆 Server Rank", value=f"#{numbers['rank']:,}", inline=True)
+
+        embed.set_footer(text="Ranked by roasts given in this server")
+
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def leaderboard(self, ctx, scope=None):
+        """Top roasted, battle winners and roasters in this server (or `global`)"""
+        scope = GLOBAL if scope == 'global' else (ctx.guild.id if ctx.guild else None)
+        cached = self.leaderboards.get(scope)
+        if cached and cached[0] > time.monotonic():
+            await ctx.send(embed=cached[1])
+            return
+
+        title = "🌍 GLOBAL LEADERBOARD" if scope == GLOBAL else "🏆 SERVER LEADERBOARD"
+        embed = discord.Embed(title=title, color=0xFFD700)
+        for name, metric in LEADERBOARDS:
+            top = await roast_stats.leaderboard(scope, metric, limit=5)
+            lines = [f"**{place}.** <@{user_id}> - {count:,}" for place, (user_id, count) in enumerate(top, 1)]
+            embed.add_field(name=name, value="\n".join(lines) or "Nobody yet", inline=False)
+        embed.set_footer(text=f"Updated every {LEADERBOARD_TTL:g}s")
+
+        now = time.monotonic()
+        self.leaderboards = {key: entry for key, entry in self.leaderboards.items() if entry[0] > now}
+        self.leaderboards[scope] = (now + LEADERBOARD_TTL, embed)
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def verse(self, ctx, target: discord.Member = None):
+        """Generate a savage rap verse roast"""
+        target_name, mention = member_or_author(ctx, target)
+
+        async with ctx.typing():
+            reply, verse = await stream_prompt_request(
+                ctx, 'verse', lambda text: {'content': f"🎤 **RAP BATTLE VERSE** 🎤\n{mention}\n```{text}```"},
+                target=target_name
+            )
+
+        if not verse:
+            verse = fallbacks.pick('verse', target=target_name)
+
+        await reply.finish(verse)
+        count_roast(ctx, target or ctx.author)
+
+    @commands.command()
+    async def compare(self, ctx, user1: discord.Member = None, user2: discord.Member = None):
+        """AI compares two users in a savage way"""
+        if not user1 or not user2:
+            await ctx.send("🔥 Usage: `,compare @user1 @user2` - Let AI brutally compare two people!")
+            return
+
+        if user1 == user2:
+            await ctx.send("🔥 Comparing someone to themselves? That's the level of creativity I'd expect from you.")
+            return
+
+        async with ctx.typing():
+            comparison = await prompt_request('compare', first=user1.display_name, second=user2.display_name)
+
+        if not comparison:
+            comparison = fallbacks.pick('compare', user1=user1.display_name, user2=user2.display_name)
+
+        embed = discord.Embed(title="⚖️ SAVAGE COMPARISON ⚖️", color=0xFF6600)
+        embed.add_field(name="The Verdict", value=comparison, inline=False)
+        embed.add_field(name="Contestants", value=f"{user1.mention} vs {user2.mention}", inline=False)
+
+        await ctx.send(embed=embed)
+        count_roast(ctx, user1, user2)
+
+    @commands.command()
+    async def truth(self, ctx, target: discord.Member = None):
+        """Brutally honest AI truth about someone"""
+        target_name, mention = member_or_author(ctx, target)
+
+        async with ctx.typing():
+            truth = await prompt_request('truth', target=target_name)
+
+        if not truth:
+            truth = fallbacks.pick('truth')
+
+        await ctx.send(f"💎 **BRUTAL TRUTH** 💎\n{mention} {truth}")
+        count_roast(ctx, target or ctx.author)
+
+    @commands.command()
+    async def roastme(self, ctx):
+        """Get the most savage roast possible"""
+        target_name = ctx.author.display_name
+        mention = ctx.author.mention
+
+        def render(text):
+            embed = discord.Embed(title="💀 MAXIMUM DAMAGE ROAST 💀", description="*You asked for this...*", color=0x8B0000)
+            embed.add_field(name="Target Destroyed", value=mention, inline=False)
+            embed.add_field(name="The Annihilation", value=text, inline=False)
+            embed.set_footer(text="⚠️ Emotional support not included")
+            return {'embed': embed}
+
+        reply = ProgressiveMessage(ctx, render)
+        roast = roast_pool.take('roastme', target_name)
+
+        if not roast:
+            async with ctx.typing():
+                reply, roast = await stream_prompt_request(ctx, 'roastme', render, target=target_name)  # Maximum chaos
+
+        if not roast:
+            roast = fallbacks.pick('roastme')
+
+        await reply.finish(roast)
+        count_roast(ctx, ctx.author)
+
+    @commands.command()
+    async def therapy(self, ctx, target: discord.Member = None):
+        """Fake therapy session that's actually a roast"""
+        target_name, mention = member_or_author(ctx, target)
+
+        async with ctx.typing():
+            def render(text):
+                embed = discord.Embed(title="🛋️ THERAPY SESSION 🛋️", color=0x8FBC8F)
+                embed.add_field(name="Patient", value=mention, inline=True)
+                embed.add_field(name="Session Notes", value=text, inline=False)
+                embed.set_footer(text="Dr. Roastbot | Not a real therapist")
+                return {'embed': embed}
+
+            reply, therapy = await stream_prompt_request(ctx, 'therapy', render, target=target_name)
+
+        if not therapy:
+            therapy = fallbacks.pick('therapy', target=target_name)
+
+        await reply.finish(therapy)
+        count_roast(ctx, target or ctx.author)
+
+    @commands.command()
+    async def fortune(self, ctx, target: discord.Member = None):
+        """Dark fortune telling with savage predictions"""
+        target_name, mention = member_or_author(ctx, target)
+
+        async with ctx.typing():
+            fortune = await prompt_request('fortune', target=target_name)
+
+        if not fortune:
+            fortune = fallbacks.pick('fortune', target=target_name)
+
+        embed = discord.Embed(title="🔮 DARK FORTUNE 🔮", color=0x4B0082)
+        embed.add_field(name="Seeker of Truth", value=mention, inline=True)
+        embed.add_field(name="Your Destiny", value=fortune, inline=False)
+        embed.set_footer(text="🌙 Madame Roastbot's Crystal Ball")
+
+        await ctx.send(embed=embed)
+        count_roast(ctx, target or ctx.author)
+
+
+async def setup(bot):
+    await bot.add_cog(Roasting(bot))
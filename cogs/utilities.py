@@ -0,0 +1,103 @@
+import logging
+import random
+
+import discord
+from discord.ext import commands
+
+from sessions import POLL_DURATION, POLL_REACTIONS, PollSession, session_registry
+
+logger = logging.getLogger(__name__)
+
+
+class Utilities(commands.Cog):
+    """Polls, coin flips, dice and decisions (no AI involved)"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command()
+    async def poll(self, ctx, *, question_and_options=None):
+        """Create a poll with options"""
+        if not question_and_options:
+            await ctx.send("🔥 Usage: `,poll Question here | Option 1 | Option 2 | Option 3`")
+            return
+
+        parts = question_and_options.split(" | ")
+        if len(parts) < 3:
+            await ctx.send("🔥 Need at least a question and 2 options! Use | to separate them.")
+            return
+
+        question = parts[0]
+        options = parts[1:6]  # Max 5 options
+
+        # Votes are tallied from reaction events and the embed is edited as they come in
+        poll = PollSession(None, question, options, guild_id=ctx.guild.id if ctx.guild else None)
+        poll.message = await ctx.send(embed=poll.render())
+        session_registry.open(poll.message.id, poll, POLL_DURATION)
+        session_registry.add_reactions(poll.message, POLL_REACTIONS[:len(options)])
+
+    @commands.command()
+    async def flip(self, ctx):
+        """Coin flip with style"""
+        result = random.choice(["Heads", "Tails"])
+
+        embed = discord.Embed(title="🪙 COIN FLIP 🪙", color=0xFFD700)
+        embed.add_field(name="Result", value=f"**{result}**", inline=False)
+        embed.add_field(name="Flipper", value=ctx.author.mention, inline=True)
+
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def dice(self, ctx, dice_notation="1d6"):
+        """Roll dice (e.g., 2d6, 1d20)"""
+        try:
+            parts = dice_notation.lower().split('d')
+            if len(parts) != 2:
+                raise ValueError
+
+            num_dice = int(parts[0])
+            num_sides = int(parts[1])
+
+            if num_dice > 10 or num_sides > 100:
+                await ctx.send("🔥 Let's keep it reasonable! Max 10 dice with 100 sides each.")
+                return
+
+            rolls = [random.randint(1, num_sides) for _ in range(num_dice)]
+            total = sum(rolls)
+
+            embed = discord.Embed(title="🎲 DICE ROLL 🎲", color=0xFF4500)
+            embed.add_field(name="Dice", value=f"{num_dice}d{num_sides}", inline=True)
+            embed.add_field(name="Rolls", value=str(rolls), inline=True)
+            embed.add_field(name="Total", value=f"**{total}**", inline=True)
+            embed.add_field(name="Roller", value=ctx.author.mention, inline=False)
+
+            await ctx.send(embed=embed)
+
+        except:
+            await ctx.send("🔥 Use format like `2d6` (2 six-sided dice) or `1d20` (1 twenty-sided die)")
+
+    @commands.command()
+    async def choose(self, ctx, *, options=None):
+        """Decision maker - choose from options"""
+        if not options:
+            await ctx.send("🔥 Usage: `,choose pizza | burgers | tacos` - Let me decide for you!")
+            return
+
+        choices = [choice.strip() for choice in options.split("|")]
+        if len(choices) < 2:
+            await ctx.send("🔥 Give me at least 2 options separated by | symbols!")
+            return
+
+        chosen = random.choice(choices)
+
+        embed = discord.Embed(title="🤖 DECISION MAKER 🤖", color=0x8A2BE2)
+        embed.add_field(name="Options", value=" | ".join(choices), inline=False)
+        embed.add_field(name="My Choice", value=f"**{chosen}**", inline=False)
+        embed.add_field(name="For", value=ctx.author.mention, inline=True)
+        embed.set_footer(text="Decision made with advanced AI randomness")
+
+        await ctx.send(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(Utilities(bot))
@@ -0,0 +1,196 @@
+import json
+import os
+import random
+import sys
+from array import array
+from collections import OrderedDict
+from string import Formatter
+
+from ai_scheduler import request_origin
+
+# Built-in replies used when the AI is unavailable, read from disk on first use
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fallbacks.json')
+
+_store = None
+
+
+def compile_template(text):
+    """
+    Pre-split a ``{field}`` template into a flat tuple of interned parts
+
+    Literals sit at even positions and field names at odd ones, so rendering
+    is a join instead of a ``str.format`` parse per call. Templates without
+    fields stay plain strings.
+    """
+    parts = ['']
+    for literal, field, _, _ in Formatter().parse(text):
+        parts[-1] += literal
+        if field:
+            parts += [sys.intern(field), '']
+    return parts[0] if len(parts) == 1 else tuple(parts)
+
+
+def render_template(template, fields):
+    if isinstance(template, str):
+        return template
+    return ''.join(part if index % 2 == 0 else fields[part] for index, part in enumerate(template))
+
+
+class _Ring:
+    """Fixed-size buffer of the most recently served entry ids"""
+
+    __slots__ = ('ids', 'pos')
+
+    def __init__(self, size):
+        self.ids = array('l', [-1] * size)
+        self.pos = 0
+
+    def push(self, entry_id):
+        self.ids[self.pos] = entry_id
+        self.pos = (self.pos + 1) % len(self.ids)
+
+    def contains(self, entry_id, depth):
+        """Whether ``entry_id`` is among the last ``depth`` pushes"""
+        size = len(self.ids)
+        return any(self.ids[(self.pos - back) % size] == entry_id for back in range(1, depth + 1))
+
+
+class FallbackCorpus:
+    """
+    Indexed store of built-in replies with no-repeat sampling
+
+    Entries are compiled once into shared tuples and indexed by command and
+    by (command, tag), so a pick is a random index into a prebuilt id list.
+    The last ``window`` picks per channel and per user (and process-wide when
+    neither is known) are kept in small ring buffers and skipped, so the same
+    line doesn't come back twice in a row. Only the ``max_histories`` most
+    recently active histories are kept.
+    """
+
+    def __init__(self, window=8, max_histories=4096, attempts=8):
+        self.window = window
+        self.max_histories = max_histories
+        self.attempts = attempts
+        # Entry id -> compiled template; multi-part entries (riddles) keep their parts aside
+        self.entries = []
+        self.structured = {}
+        self.index = {}
+        self.histories = OrderedDict()
+
+    @classmethod
+    def load(cls, path=CORPUS_PATH, **options):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        store = cls(**options)
+        for command, entries in data.items():
+            for entry in entries:
+                store.add(command, entry)
+        return store
+
+    def add(self, command, entry):
+        """
+        Add one entry for ``command``
+
+        Args:
+            command: Corpus name (usually the command name)
+            entry: A template string, or a mapping of template strings with
+                an optional ``tags`` list (e.g. riddles with an answer)
+        """
+        if isinstance(entry, str):
+            parts, tags = {'text': entry}, ()
+        else:
+            parts = {key: value for key, value in entry.items() if key != 'tags'}
+            tags = entry.get('tags', ())
+        entry_id = len(self.entries)
+        if list(parts) == ['text']:
+            self.entries.append(compile_template(parts['text']))
+        else:
+            self.entries.append(None)
+            self.structured[entry_id] = tuple((sys.intern(key), compile_template(text)) for key, text in parts.items())
+        self.index.setdefault(command, array('l')).append(entry_id)
+        for tag in tags:
+            self.index.setdefault((command, tag), array('l')).append(entry_id)
+
+    def pick(self, command, tags=(), channel_id=None, user_id=None, **fields):
+        """
+        Pick a built-in entry for ``command`` that the channel and user haven't seen lately
+
+        Args:
+            command: Corpus name
+            tags: Preferred tags; the first one with entries is used, else any entry
+            channel_id: Channel to avoid repeats in
+            user_id: User to avoid repeats for
+            **fields: Values for ``{field}`` placeholders
+
+        Returns:
+            The rendered text, or a dict of rendered parts for structured entries
+        """
+        ids = next((self.index[(command, tag)] for tag in tags if (command, tag) in self.index), None)
+        if ids is None:
+            ids = self.index[command]
+
+        rings = [
+            self._history(scope, owner, command)
+            for scope, owner in (('channel', channel_id), ('user', user_id))
+            if owner is not None
+        ] or [self._history('global', None, command)]
+        # Small corpora can only avoid as many repeats as they have spare entries
+        depth = min(self.window, len(ids) - 1)
+
+        entry_id = self._sample(ids, rings, depth)
+        for ring in rings:
+            ring.push(entry_id)
+
+        if entry_id in self.structured:
+            return {key: render_template(template, fields) for key, template in self.structured[entry_id]}
+        return render_template(self.entries[entry_id], fields)
+
+    def _sample(self, ids, rings, depth):
+        if depth <= 0:
+            return ids[random.randrange(len(ids))]
+        for _ in range(self.attempts):
+            entry_id = ids[random.randrange(len(ids))]
+            if not any(ring.contains(entry_id, depth) for ring in rings):
+                return entry_id
+        # Rare on large corpora: walk from a random start to the first fresh entry
+        start = random.randrange(len(ids))
+        for offset in range(len(ids)):
+            entry_id = ids[(start + offset) % len(ids)]
+            if not any(ring.contains(entry_id, depth) for ring in rings):
+                return entry_id
+        return ids[start]
+
+    def _history(self, scope, owner, command):
+        key = (scope, owner, command)
+        ring = self.histories.get(key)
+        if ring is None:
+            ring = self.histories[key] = _Ring(self.window)
+            if len(self.histories) > self.max_histories:
+                self.histories.popitem(last=False)
+        else:
+            self.histories.move_to_end(key)
+        return ring
+
+
+def store():
+    """The shared corpus (loaded from disk the first time it is needed)"""
+    global _store
+    if _store is None:
+        _store = FallbackCorpus.load()
+    return _store
+
+
+def pick(name, tags=(), **fields):
+    """
+    Pick a built-in entry for ``name`` without repeating recent ones
+
+    Repeats are avoided per channel and per user of the current command when
+    there is one.
+    """
+    origin = request_origin.get()
+    return store().pick(
+        name, tags,
+        channel_id=origin.channel_id if origin else None,
+        user_id=origin.user_id if origin else None,
+        **fields
+    )
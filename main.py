@@ -1,13 +1,19 @@
 import discord
 from discord.ext import commands
-import requests
+import aiohttp
 import asyncio
 import logging
 import random
 import os
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+import fallbacks
+from ai_circuit import CircuitOpen
+from ai_providers import Provider
+from ai_transport import AITransport, AITransportError
+from bot_logging import log_command, setup_logging, start_command_timer
+
+# Set up logging (written from a background thread, see bot_logging)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 class RoastBot(commands.Bot):
@@ -26,39 +32,33 @@ class RoastBot(commands.Bot):
             logger.error("DISCORD_BOT_TOKEN environment variable is required")
             raise ValueError("Discord bot token not provided")
         
-        # AI API is optional - bot will work with built-in roasts if not provided
+        # AI API is optional - bot will work with built-in roasts (the savage_roast set in fallbacks.json) if not provided
         if not self.ai_api_url or not self.ai_api_key:
             logger.warning("AI API URL or key not provided - using built-in savage roasts")
             self.use_fallback_roasts = True
         else:
             self.use_fallback_roasts = False
         
-        # Built-in savage roasts for when AI API isn't available
-        self.savage_roasts = [
-            "{target}, your existence is so bland that even vanilla ice cream calls you basic.",
-            "{target}, I've seen more personality in a Windows error message.",
-            "{target}, you're the human equivalent of a participation trophy - technically there, but nobody's impressed.",
-            "{target}, your life is like a broken pencil - completely pointless.",
-            "{target}, if stupidity was a superpower, you'd be the entire Justice League.",
-            "{target}, you're proof that even God makes rough drafts.",
-            "{target}, I'd call you a tool, but that would be insulting to useful objects.",
-            "{target}, your brain must be made of the same material as a black hole - nothing gets out.",
-            "{target}, you're like a software update - nobody wants you, but you show up anyway.",
-            "{target}, calling you a clown would be unfair to professional entertainers.",
-            "{target}, your IQ is so low, you'd lose a debate with a goldfish.",
-            "{target}, you're the reason aliens won't visit Earth.",
-            "{target}, if ignorance is bliss, you must be the happiest person alive.",
-            "{target}, your personality has all the depth of a puddle in the desert.",
-            "{target}, you're like a WiFi password - completely forgettable and nobody wants to share you.",
-            "{target}, I've met brick walls with more emotional intelligence than you.",
-            "{target}, your sense of humor is drier than the Sahara and twice as empty.",
-            "{target}, you're the human equivalent of a 'Skip Ad' button - everyone wants you gone.",
-            "{target}, if awkwardness was an art form, you'd be the Mona Lisa.",
-            "{target}, your life choices make a random number generator look strategic."
-        ]
+        # Shared async connection pool for AI calls (opened in setup_hook, closed in close)
+        self.ai_transport = AITransport()
+        
+        # Response shape is handled by a provider adapter ('generic' understands OpenAI, Anthropic and plain text bodies)
+        self.ai_provider = None
+        if not self.use_fallback_roasts:
+            self.ai_provider = Provider('custom', self.ai_api_url, self.ai_api_key, adapter=os.getenv('AI_API_ADAPTER', 'generic'))
         
         logger.info("Environment variables loaded successfully")
 
+    async def setup_hook(self):
+        """Open the AI connection pool before connecting to the gateway"""
+        if not self.use_fallback_roasts:
+            await self.ai_transport.start()
+
+    async def close(self):
+        """Close the AI connection pool along with the gateway connection"""
+        await self.ai_transport.close()
+        await super().close()
+
     async def on_ready(self):
         """Called when the bot has successfully logged in and is ready"""
         logger.info(f'Bot logged in as {self.user}')
@@ -70,26 +70,23 @@ class RoastBot(commands.Bot):
             print("Invite link: https://discord.com/oauth2/authorize?client_id={}&permissions=2048&scope=bot".format(self.user.id))
 
     async def on_message(self, message):
-        """Debug message processing"""
-        if message.author == self.user:
+        """Hand prefixed messages to the command handler"""
+        # Drop chat and bot messages (us included) before logging or building a Context
+        if message.author.bot or not message.content.startswith(self.command_prefix):
             return
         
-        logger.info(f"Received message: '{message.content}' from {message.author} in {message.guild}")
-        
-        # Check if it's a command
-        if message.content.startswith(self.command_prefix):
-            logger.info(f"Command detected: '{message.content}'")
+        logger.debug("Message %s from %s in %s", message.id, message.author.id, message.channel.id)
         
         # Process commands
         await self.process_commands(message)
 
     async def on_command(self, ctx):
         """Called when a command is invoked"""
-        logger.info(f"Command '{ctx.command}' invoked by {ctx.author}")
+        start_command_timer(ctx)
 
     async def on_command_completion(self, ctx):
         """Called when a command completes successfully"""
-        logger.info(f"Command '{ctx.command}' completed successfully")
+        log_command(ctx)
 
     async def get_ai_roast(self, target: str):
         """
@@ -103,9 +100,8 @@ class RoastBot(commands.Bot):
         """
         # Use fallback roasts if AI API is not configured
         if self.use_fallback_roasts:
-            roast_template = random.choice(self.savage_roasts)
-            roast = roast_template.format(target=target)
-            logger.info(f"Generated built-in roast for: {target}")
+            roast = fallbacks.pick('savage_roast', target=target)
+            logger.debug("Generated built-in roast for: %s", target)
             return roast
             
         # Try to use AI API if configured
@@ -113,83 +109,33 @@ class RoastBot(commands.Bot):
             # Craft the savage roast prompt - made extra brutal as requested
             prompt = f"Roast {target} in an extremely savage, dark-humor style. Make it creative, absurd, and sarcastic. Be brutally unhinged but clever. No slurs, no NSFW, no real-world tragedies. Maximum savagery and wit required. Make it devastatingly funny and brutal."
             
-            # Prepare the API request headers
-            headers = {
-                'Authorization': f'Bearer {self.ai_api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            # Generic payload structure - user will need to adjust based on their AI API
-            # Common formats work with OpenAI, Anthropic, and similar APIs
-            payload = {
-                'prompt': prompt,
-                'max_tokens': 150,
-                'temperature': 0.9  # High temperature for more creative/savage responses
-            }
+            logger.debug("Making AI API request to roast: %s", target)
             
-            logger.info(f"Making AI API request to roast: {target}")
-            
-            # Make the API request with timeout - ensure URL is not None
-            if not self.ai_api_url:
-                logger.warning("AI API URL is not configured, falling back to built-in roasts")
-                roast_template = random.choice(self.savage_roasts)
-                return roast_template.format(target=target)
-                
-            response = requests.post(
-                self.ai_api_url,
-                json=payload,
-                headers=headers,
-                timeout=10
+            choices = await self.ai_provider.complete(
+                self.ai_transport,
+                [{"role": "user", "content": prompt}],
+                max_tokens=150,
+                temperature=0.9  # High temperature for more creative/savage responses
             )
             
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Try common response formats used by different AI APIs
-                roast = None
-                
-                # OpenAI format
-                if 'choices' in data and len(data['choices']) > 0:
-                    roast = data['choices'][0].get('text', '').strip()
-                    if not roast:
-                        roast = data['choices'][0].get('message', {}).get('content', '').strip()
-                
-                # Anthropic/Claude format
-                elif 'completion' in data:
-                    roast = data['completion'].strip()
-                
-                # Generic formats
-                elif 'response' in data:
-                    roast = data['response'].strip()
-                elif 'output' in data:
-                    roast = data['output'].strip()
-                elif 'text' in data:
-                    roast = data['text'].strip()
-                
-                if roast:
-                    logger.info(f"Successfully generated AI roast for: {target}")
-                    return roast
-                else:
-                    logger.warning("AI API returned empty response, using fallback")
-                    roast_template = random.choice(self.savage_roasts)
-                    return roast_template.format(target=target)
-            else:
-                logger.warning(f"AI API request failed with status {response.status_code}, using fallback")
-                roast_template = random.choice(self.savage_roasts)
-                return roast_template.format(target=target)
+            logger.debug("Successfully generated AI roast for: %s", target)
+            return choices[0]
                 
-        except requests.exceptions.Timeout:
+        except AITransportError as e:
+            logger.warning(f"AI API request failed with status {e.status}, using fallback")
+            return fallbacks.pick('savage_roast', target=target)
+        except CircuitOpen:
+            logger.warning("AI API is failing repeatedly, using fallback")
+            return fallbacks.pick('savage_roast', target=target)
+        except asyncio.TimeoutError:
             logger.warning("AI API request timed out, using fallback")
-            roast_template = random.choice(self.savage_roasts)
-            return roast_template.format(target=target)
-        except requests.exceptions.RequestException as e:
+            return fallbacks.pick('savage_roast', target=target)
+        except aiohttp.ClientError as e:
             logger.warning(f"AI API request failed: {str(e)}, using fallback")
-            roast_template = random.choice(self.savage_roasts)
-            return roast_template.format(target=target)
+            return fallbacks.pick('savage_roast', target=target)
         except Exception as e:
             logger.warning(f"Unexpected error getting AI roast: {str(e)}, using fallback")
-            roast_template = random.choice(self.savage_roasts)
-            return roast_template.format(target=target)
+            return fallbacks.pick('savage_roast', target=target)
 
     @commands.command()
     async def roast(self, ctx, *, target=None):
@@ -238,7 +184,7 @@ class RoastBot(commands.Bot):
                     response = f"🔥 {roast}"
                 
                 await ctx.send(response)
-                logger.info(f"Successfully roasted {target_name}")
+                logger.debug("Successfully roasted %s", target_name)
                     
         except Exception as e:
             logger.error(f"Error in roast command: {str(e)}")
@@ -247,7 +193,6 @@ class RoastBot(commands.Bot):
     @commands.command()
     async def test(self, ctx):
         """Simple test command to verify bot is working"""
-        logger.info(f"Test command called by {ctx.author}")
         await ctx.send("🔥 Bot is working! Use `!roast` to get roasted!")
 
     async def on_command_error(self, ctx, error):
@@ -267,7 +212,8 @@ class RoastBot(commands.Bot):
             if not self.discord_token:
                 logger.error("Discord token is not configured")
                 raise ValueError("Discord token missing")
-            self.run(self.discord_token)
+            # Logging is already set up; stop discord.py from adding its own handler
+            self.run(self.discord_token, log_handler=None)
         except discord.LoginFailure:
             logger.error("Failed to login - check your Discord bot token")
             raise
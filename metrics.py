@@ -0,0 +1,253 @@
+import asyncio
+import bisect
+import logging
+import math
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cached reply to a command that hit its deadline
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Bucketed observations per label set, plus their sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (+Inf last), sum]
+        self.values = {}
+
+    def observe(self, value, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *labels):
+        series = self.values.get(labels)
+        return sum(series[0]) if series else 0
+
+    def quantile(self, q, *labels):
+        """Estimate the ``q`` quantile by interpolating inside its bucket (0.0 if nothing observed)"""
+        series = self.values.get(labels)
+        if not series:
+            return 0.0
+        counts = series[0]
+        rank = q * sum(counts)
+        seen = 0
+        for index, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def samples(self):
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(bound)
+                yield f"{self.name}_bucket", _labels(self.labelnames, labels, [('le', le)]), cumulative
+            yield f"{self.name}_sum", _labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _labels(self.labelnames, labels), cumulative
+
+
+class Gauge:
+    """A value read when metrics are scraped, from ``read()`` returning {label tuple: value}"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, read, labelnames=()):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        for labels, value in self.read().items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Registry:
+    """A set of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name, help, read, labelnames=()):
+        return self.register(Gauge(name, help, read, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+COMMANDS = REGISTRY.counter('bot_commands_total', "Commands run, by outcome (ok or error)", ('command', 'outcome'))
+COMMAND_SECONDS = REGISTRY.histogram('bot_command_seconds', "Time from invoke to the end of the command", ('command',))
+DISCORD_SEND_SECONDS = REGISTRY.histogram('discord_send_seconds', "Time to send a reply to Discord", ('command',))
+AI_QUEUE_WAIT_SECONDS = REGISTRY.histogram('ai_queue_wait_seconds', "Time AI calls waited for a scheduler slot", ('command',))
+AI_PROVIDER_SECONDS = REGISTRY.histogram('ai_provider_seconds', "Time spent in AI provider calls (including hedges and failover)", ('command',))
+# outcome: ok, cache, shed, limited, over_budget, circuit_open, timeout, error
+AI_REQUESTS = REGISTRY.counter('ai_requests_total', "AI requests by outcome; anything but ok and cache is served from fallbacks", ('command', 'outcome'))
+# kind: prompt and completion as reported by the provider, completion_estimated for streams (~4 chars a token)
+AI_TOKENS = REGISTRY.counter('ai_tokens_total', "Tokens used by AI calls", ('command', 'kind'))
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    'event_loop_lag_seconds', "How late the event loop woke up from a timed sleep",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+AI_PROMPT_VERSIONS = REGISTRY.counter('ai_prompt_version_total', "Registered prompts used, by version (for A/B splits)", ('prompt', 'version'))
+
+# Outcomes where the AI answered (fresh or cached); every other one means a fallback reply
+ANSWERED = ('ok', 'cache')
+
+
+class LoopLagMonitor:
+    """Sleeps ``interval`` at a time and records how much later than asked the loop woke up"""
+
+    def __init__(self, interval=0.25, window=240):
+        self.interval = interval
+        # Most recent lags, for heartbeats and summaries
+        self.recent = deque(maxlen=window)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            self.recent.append(lag)
+
+    def summary(self):
+        """p50, p99 and max of the recent lags, in seconds"""
+        if not self.recent:
+            return {'p50': 0.0, 'p99': 0.0, 'max': 0.0}
+        lags = sorted(self.recent)
+        return {
+            'p50': lags[len(lags) // 2],
+            'p99': lags[min(len(lags) - 1, int(len(lags) * 0.99))],
+            'max': lags[-1]
+        }
+
+
+def command_label(origin):
+    """Metric label for the command behind ``origin`` (background work has none)"""
+    return origin.command if origin and origin.command else '-'
+
+
+def command_summary():
+    """
+    Per-command totals for ,perf, busiest token users first
+
+    Returns:
+        List of dicts with command, calls, errors, p50/p95 latency, p95
+        queue wait, provider and send time, AI requests, fallback and cache
+        rates and tokens
+    """
+    commands = {labels[0] for metric in (COMMANDS, AI_REQUESTS, AI_TOKENS) for labels in metric.values}
+    summary = []
+    for command in commands:
+        outcomes = {labels[1]: count for labels, count in AI_REQUESTS.values.items() if labels[0] == command}
+        ai_requests = sum(outcomes.values())
+        summary.append({
+            'command': command,
+            'calls': COMMANDS.get(command, 'ok') + COMMANDS.get(command, 'error'),
+            'errors': COMMANDS.get(command, 'error'),
+            'p50': COMMAND_SECONDS.quantile(0.5, command),
+            'p95': COMMAND_SECONDS.quantile(0.95, command),
+            'queue_p95': AI_QUEUE_WAIT_SECONDS.quantile(0.95, command),
+            'provider_p95': AI_PROVIDER_SECONDS.quantile(0.95, command),
+            'send_p95': DISCORD_SEND_SECONDS.quantile(0.95, command),
+            'ai_requests': ai_requests,
+            'fallback_rate': sum(count for outcome, count in outcomes.items() if outcome not in ANSWERED) / ai_requests if ai_requests else 0.0,
+            'cache_rate': outcomes.get('cache', 0) / ai_requests if ai_requests else 0.0,
+            'tokens': sum(count for labels, count in AI_TOKENS.values.items() if labels[0] == command)
+        })
+    summary.sort(key=lambda row: (row['tokens'], row['calls']), reverse=True)
+    return summary
+
+
+async def start_server(host='127.0.0.1', port=9090):
+    """
+    Serve ``GET /metrics`` from the running event loop
+
+    Returns:
+        The aiohttp runner; call ``await runner.cleanup()`` to stop it.
+        None if the port can't be bound: the bot runs on without metrics.
+    """
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=REGISTRY.render(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        await runner.cleanup()
+        logger.warning(f"Metrics endpoint disabled: cannot listen on {host}:{port} ({e})")
+        return None
+    logger.info(f"Metrics served on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+
+from fallbacks import compile_template, render_template
+
+logger = logging.getLogger(__name__)
+
+# Shared start of every system prompt: the house rules every command follows.
+# Only the short role line after it differs between commands. At ~60 tokens it
+# is far below the length providers need before they cache a prompt prefix.
+SYSTEM_PREFIX = (
+    "You write replies for Hail Mary, a Discord bot. Replies are posted straight into a chat "
+    "channel: answer with the reply itself, no preamble, notes or quotation marks, and keep it "
+    "short enough for one Discord message. Never use slurs, threats or real-world tragedies.\n\n"
+)
+
+
+class PromptTemplate:
+    """
+    One version of a command's prompt, compiled when it is registered
+
+    The system prompt is built (and interned) once, the user message is
+    pre-split so rendering is a join, and the fingerprint covers everything
+    that shapes the reply, so caches and in-flight coalescing can key on it
+    instead of hashing the full prompt text.
+    """
+
+    __slots__ = ('name', 'version', 'system', 'user', 'max_tokens', 'temperature', 'fingerprint')
+
+    def __init__(self, name, version, role, user, max_tokens, temperature):
+        self.name = name
+        self.version = version
+        self.system = sys.intern(SYSTEM_PREFIX + role)
+        self.user = compile_template(user)
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        raw = json.dumps([name, version, self.system, user, max_tokens, temperature], ensure_ascii=False)
+        self.fingerprint = hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+    def render(self, **fields):
+        """The user message with ``{field}`` placeholders filled in"""
+        return render_template(self.user, fields)
+
+
+class PromptRegistry:
+    """
+    Named prompt templates per command, with weighted versions for A/B tests
+
+    Each caller is kept on one version of a prompt: the version is picked by
+    hashing the prompt name with a key (the user id), weighted by the
+    configured split. Without a key the pick is random.
+    """
+
+    def __init__(self):
+        # name -> {version: PromptTemplate}; name -> [(version, weight)]
+        self.templates = {}
+        self.weights = {}
+
+    def register(self, name, role, user, max_tokens, temperature, version='v1', weight=1.0):
+        template = PromptTemplate(name, version, role, user, max_tokens, temperature)
+        self.templates.setdefault(name, {})[version] = template
+        # Versions registered with weight 0 wait for a PROMPT_VARIANTS split
+        if weight > 0:
+            self.weights.setdefault(name, []).append((version, weight))
+        return template
+
+    def set_weights(self, name, weights):
+        """Replace the traffic split for ``name`` (version -> weight; unknown versions are ignored)"""
+        known = self.templates.get(name, {})
+        split = [(version, float(weight)) for version, weight in weights.items() if version in known and weight > 0]
+        if not split:
+            logger.warning(f"Ignoring prompt split for {name}: no known version has a positive weight")
+            return
+        self.weights[name] = split
+
+    def get(self, name, key=None):
+        """The version of prompt ``name`` that ``key`` is assigned to"""
+        split = self.weights[name]
+        if len(split) == 1:
+            return self.templates[name][split[0][0]]
+        total = sum(weight for _, weight in split)
+        if key is None:
+            point = random.random() * total
+        else:
+            digest = hashlib.blake2b(f"{name}:{key}".encode(), digest_size=8).digest()
+            point = int.from_bytes(digest, 'big') / 2 ** 64 * total
+        for version, weight in split:
+            point -= weight
+            if point < 0:
+                break
+        return self.templates[name][version]
+
+
+prompts = PromptRegistry()
+
+prompts.register(
+    'roast',
+    "You are a savage roast comedian with no filter. Generate the most brutal, unhinged roasts possible "
+    "while staying clever and avoiding actual harm.",
+    "Create an absolutely savage, dark humor roast for someone named '{target}'.\n\n"
+    "Make it:\n"
+    "- Brutally unhinged and creative\n"
+    "- Dark psychological humor\n"
+    "- Devastatingly clever wordplay\n"
+    "- Absurdly specific and weird\n"
+    "- Maximum emotional damage\n"
+    "- Absolutely ruthless\n\n"
+    "Rules: No slurs, no threats, no real-world tragedies. Just pure psychological warfare through humor.\n"
+    "Be completely unhinged but clever. Make it so brutal that even the AI feels bad for generating it.\n\n"
+    "Target: {target}",
+    200, 0.95
+)
+prompts.register(
+    'roastme',
+    "Generate the most brutal roast possible. They specifically asked for maximum damage. Show no mercy.",
+    "Generate the most savage, unhinged roast possible for {target} who specifically ASKED to be roasted. "
+    "Pull no punches. Make it so brutal it's legendary. They asked for this level of destruction.",
+    250, 1.0
+)
+prompts.register(
+    'compliment',
+    "You create backhanded compliments that start nice but end devastatingly.",
+    "Create a brutally backhanded compliment for {target}. Make it sound nice at first but devastating "
+    "by the end. Be clever and savage.",
+    150, 0.9
+)
+prompts.register(
+    'verse',
+    "You are a savage battle rapper. Create brutal, clever rap verses with perfect flow and devastating wordplay.",
+    "Write a brutal 4-line rap verse roasting {target}. Make it rhythmic, clever, and devastatingly savage. "
+    "Use hip-hop wordplay and internal rhymes.",
+    200, 0.95
+)
+prompts.register(
+    'compare',
+    "You excel at savage comparisons that roast both subjects equally with creative analogies.",
+    "Compare {first} and {second} in the most savage, creative way possible. Make it funny and brutally "
+    "honest while roasting both equally.",
+    200, 0.9
+)
+prompts.register(
+    'truth',
+    "You deliver harsh truths disguised as wisdom. Be brutally honest but cleverly humorous.",
+    "Tell a brutally honest 'truth' about {target}. Make it psychologically cutting but clever and humorous. "
+    "Frame it as harsh but honest feedback.",
+    150, 0.85
+)
+prompts.register(
+    'therapy',
+    "You're a savage therapist who gives brutally honest 'therapy' that's actually clever roasts disguised "
+    "as professional advice.",
+    "Act like a therapist giving advice to {target}, but make it a savage roast disguised as professional "
+    "therapy. Use therapy language but make it brutally funny.",
+    200, 0.9
+)
+prompts.register(
+    'fortune',
+    "You're a savage fortune teller who gives darkly humorous predictions disguised as mystical wisdom.",
+    "Act like a fortune teller giving {target} a dark, savage fortune. Use mystical language but make the "
+    "prediction brutally funny and pessimistic.",
+    200, 0.9
+)
+prompts.register(
+    'story',
+    "You're a creative storyteller. Write engaging, family-friendly short stories that are entertaining "
+    "and imaginative.",
+    "{premise}. Keep it under 200 words and make it engaging.",
+    250, 0.9
+)
+prompts.register(
+    'joke',
+    "You're a comedian who specializes in clever, family-friendly humor. Create original jokes that are "
+    "witty and entertaining.",
+    "{style}",
+    100, 0.9
+)
+prompts.register(
+    'advice',
+    "You're a wise, supportive mentor who gives genuinely helpful life advice. Be encouraging and practical.",
+    "Give genuinely helpful, positive life advice to {target}. Make it encouraging, practical, and uplifting "
+    "without being preachy.",
+    150, 0.7
+)
+prompts.register(
+    'riddle',
+    "Create original riddles with clever wordplay and surprising answers. Format: RIDDLE: [question] ANSWER: [answer]",
+    "Create an original, clever riddle with a surprising answer. Make it challenging but solvable.",
+    100, 0.8
+)
+
+# A/B splits: PROMPT_VARIANTS='{"roast": {"v1": 1, "v2": 1}}' sends half the users to v2
+# (new versions are registered above with version= and weight=0 until they are tested)
+def apply_variants(registry, value):
+    try:
+        splits = json.loads(value or '{}')
+    except ValueError:
+        logger.error("PROMPT_VARIANTS is not valid JSON - ignoring it")
+        return
+    for name, weights in splits.items():
+        if name in registry.templates:
+            registry.set_weights(name, weights)
+        else:
+            logger.warning(f"PROMPT_VARIANTS names unknown prompt {name}")
+
+
+apply_variants(prompts, os.getenv('PROMPT_VARIANTS'))
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Placeholder the AI is asked to use instead of a real name
+TEMPLATE_TARGET = "{target}"
+
+
+class RoastPool:
+    """
+    Warm pool of pre-generated, target-agnostic roast templates
+
+    Each command kind gets a bounded queue of templates containing the
+    ``{target}`` placeholder. A background task refills the queues in
+    batches while the bot is idle (no template taken and no live AI request,
+    see :meth:`touch`, for ``idle_seconds``), so commands can take a
+    ready-made roast instantly and only fall back to a live AI request when
+    the pool is empty.
+    """
+
+    def __init__(self, size=0, batch_size=5, idle_seconds=5.0, refill_interval=2.0):
+        self.size = size
+        self.batch_size = batch_size
+        self.idle_seconds = idle_seconds
+        self.refill_interval = refill_interval
+        self.queues = {}
+        self.generators = {}
+        self.last_activity = 0.0
+        self.task = None
+
+    @property
+    def enabled(self):
+        return self.size > 0 and bool(self.generators)
+
+    def register(self, kind, generate):
+        """
+        Register a template generator for a command kind
+
+        Args:
+            kind: Pool name (e.g. 'roast', 'roastme')
+            generate: Async callable taking a count and returning a list of
+                up to that many template strings
+        """
+        self.generators[kind] = generate
+        self.queues[kind] = deque(maxlen=self.size or None)
+
+    def take(self, kind, target_name):
+        """
+        Pop a template for ``kind`` and fill in the target name
+
+        Returns:
+            The finished roast, or None if the pool is empty or disabled
+        """
+        self.touch()
+        queue = self.queues.get(kind)
+        if not queue:
+            return None
+        template = queue.popleft()
+        return template.replace(TEMPLATE_TARGET, target_name)
+
+    def touch(self):
+        """Note command activity, holding refills back until the bot is idle again"""
+        self.last_activity = time.monotonic()
+
+    def start(self):
+        """Start the background refill task"""
+        if not self.enabled or self.task is not None:
+            return
+        self.task = asyncio.create_task(self._refill_loop())
+        logger.info(f"Roast pool started for {', '.join(self.generators)} (size {self.size})")
+
+    async def stop(self):
+        """Stop the background refill task"""
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def _refill_loop(self):
+        delay = self.refill_interval
+        while True:
+            if time.monotonic() - self.last_activity >= self.idle_seconds:
+                failed = False
+                for kind in self.generators:
+                    if await self._refill(kind) == 0:
+                        failed = True
+                # Back off while the provider keeps returning nothing usable
+                delay = min(delay * 2, 60.0) if failed else self.refill_interval
+            await asyncio.sleep(delay)
+
+    async def _refill(self, kind):
+        missing = self.size - len(self.queues[kind])
+        if missing <= 0:
+            return None
+        batch = min(self.batch_size, missing)
+        try:
+            # One request asks for the whole batch instead of one call per template
+            results = await self.generators[kind](batch)
+        except Exception as e:
+            logger.warning(f"Roast pool '{kind}' generation failed: {e}")
+            results = []
+        added = 0
+        for template in results or []:
+            # Templates without the placeholder would roast nobody in particular
+            if isinstance(template, str) and TEMPLATE_TARGET in template:
+                self.queues[kind].append(template)
+                added += 1
+        logger.info("Roast pool '%s' refilled with %d/%d templates (%d/%d)", kind, added, batch, len(self.queues[kind]), self.size)
+        return added
@@ -0,0 +1,297 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+POLL_REACTIONS = ["1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣"]
+RIDDLE_REACTION = "🤔"
+
+
+def owns_guild(bot, guild_id):
+    """Whether ``guild_id``'s events reach this process (DMs, guild None, go to shard 0)"""
+    shard_ids = getattr(bot, 'shard_ids', None)
+    if not bot.shard_count or shard_ids is None:
+        return True
+    shard_id = (guild_id >> 22) % bot.shard_count if guild_id else 0
+    return shard_id in shard_ids
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel: O(1) schedule and cancel, one slot looked at per tick
+
+    Keys due more than one turn of the wheel away carry a count of extra
+    turns to wait, so ``slots`` only bounds the per-tick work, not the
+    longest delay.
+    """
+
+    def __init__(self, slots=512, tick=1.0):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]
+        self.position = 0
+        # key -> slot index, for cancelling
+        self.where = {}
+
+    def schedule(self, key, delay):
+        """Fire ``key`` after ``delay`` seconds (rounded up to whole ticks)"""
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        index = (self.position + ticks) % len(self.slots)
+        self.slots[index][key] = (ticks - 1) // len(self.slots)
+        self.where[key] = index
+
+    def cancel(self, key):
+        index = self.where.pop(key, None)
+        if index is not None:
+            del self.slots[index][key]
+
+    def advance(self):
+        """Move one tick on and return the keys that are now due"""
+        self.position = (self.position + 1) % len(self.slots)
+        slot = self.slots[self.position]
+        due = []
+        for key, turns in list(slot.items()):
+            if turns:
+                slot[key] = turns - 1
+            else:
+                due.append(key)
+                del slot[key]
+                del self.where[key]
+        return due
+
+
+class RiddleSession:
+    """A posted riddle waiting for someone to ask for the answer"""
+
+    persistent = False
+
+    def __init__(self, message, channel, answer):
+        self.message = message
+        self.channel = channel
+        self.answer = answer
+
+    def on_reaction(self, registry, emoji, user_id, added):
+        if added and emoji == RIDDLE_REACTION:
+            registry.close(self)
+            registry.spawn(self.reveal())
+
+    async def reveal(self):
+        embed = discord.Embed(title="💡 ANSWER REVEALED 💡", color=0x00FF7F)
+        embed.add_field(name="Solution", value=self.answer, inline=False)
+        await self.channel.send(embed=embed)
+
+    def on_expire(self, registry):
+        pass  # Nobody asked, the answer stays secret
+
+
+class PollSession:
+    """An open poll whose tally follows its number reactions"""
+
+    persistent = True
+
+    def __init__(self, message, question, options, counts=None, closes_at=None, guild_id=None):
+        self.message = message
+        self.guild_id = guild_id
+        self.question = question
+        self.options = options
+        self.counts = counts or [0] * len(options)
+        # Wall-clock time the poll closes, so it survives restarts
+        self.closes_at = closes_at
+        self.closed = False
+
+    def on_reaction(self, registry, emoji, user_id, added):
+        try:
+            index = POLL_REACTIONS.index(emoji, 0, len(self.options))
+        except ValueError:
+            return
+        self.counts[index] = max(0, self.counts[index] + (1 if added else -1))
+        registry.mark_dirty(self)
+
+    def on_expire(self, registry):
+        self.closed = True
+        registry.mark_dirty(self)
+
+    def render(self):
+        total = sum(self.counts)
+        embed = discord.Embed(title="📊 POLL (CLOSED)" if self.closed else "📊 POLL", color=0x1E90FF)
+        embed.add_field(name="Question", value=self.question, inline=False)
+        lines = []
+        for emoji, option, count in zip(POLL_REACTIONS, self.options, self.counts):
+            share = count / total if total else 0.0
+            lines.append(f"{emoji} {option}\n`{'█' * round(share * 10):<10}` {count} ({share:.0%})")
+        embed.add_field(name="Options", value="\n".join(lines), inline=False)
+        embed.set_footer(text=f"{total} vote{'s' if total != 1 else ''}" + ("" if self.closed else " | React to vote!"))
+        return embed
+
+
+class SessionRegistry:
+    """
+    Open riddles and polls, indexed by message id
+
+    The bot's raw reaction events are routed here, so a reaction costs one
+    dict lookup however many sessions are open and no coroutine waits per
+    message. Sessions expire on a :class:`TimerWheel` advanced by a single
+    task, which also applies poll tally changes at most once per
+    ``edit_interval`` per poll (one message edit and one database write).
+    Polls are kept in SQLite and picked up again after a restart, each by
+    the shard process that owns its guild.
+    """
+
+    def __init__(self, path, tick=1.0, slots=512, edit_interval=2.0):
+        self.path = path
+        self.wheel = TimerWheel(slots, tick)
+        self.edit_interval = edit_interval
+        self.sessions = {}
+        self.dirty = set()
+        self.bot = None
+        self.db = None
+        # One save at a time: a cancelled flush's thread may still be writing
+        self.save_lock = threading.Lock()
+        self.task = None
+        self.background = set()
+
+    def open(self, message_id, session, ttl):
+        """Start routing reactions on ``message_id`` to ``session`` for ``ttl`` seconds"""
+        self.sessions[message_id] = session
+        self.wheel.schedule(message_id, ttl)
+        if session.persistent:
+            session.closes_at = session.closes_at or time.time() + ttl
+            self.mark_dirty(session)
+
+    def close(self, session):
+        message_id = session.message.id
+        self.sessions.pop(message_id, None)
+        self.wheel.cancel(message_id)
+
+    def mark_dirty(self, session):
+        self.dirty.add(session)
+
+    def spawn(self, coro):
+        """Run ``coro`` in the background, keeping a reference until it is done"""
+        task = asyncio.create_task(coro)
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+        return task
+
+    def add_reactions(self, message, emojis):
+        """Add reactions in order without holding up the command"""
+        async def add():
+            for emoji in emojis:
+                try:
+                    await message.add_reaction(emoji)
+                except discord.HTTPException as e:
+                    logger.warning(f"Could not add reaction {emoji}: {e}")
+                    return
+        return self.spawn(add())
+
+    def handle_reaction(self, payload, added):
+        """Route a raw reaction event (O(1); ignores the bot's own reactions)"""
+        session = self.sessions.get(payload.message_id)
+        if session is None or (self.bot.user and payload.user_id == self.bot.user.id):
+            return
+        session.on_reaction(self, str(payload.emoji), payload.user_id, added)
+
+    def start(self, bot):
+        """Open the database, reopen unfinished polls and start the clock"""
+        if self.task is not None:
+            return
+        self.bot = bot
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS polls (message_id INTEGER PRIMARY KEY, channel_id INTEGER NOT NULL, "
+            "question TEXT NOT NULL, options TEXT NOT NULL, counts TEXT NOT NULL, "
+            "closes_at REAL NOT NULL, closed INTEGER NOT NULL DEFAULT 0, guild_id INTEGER)"
+        )
+        if 'guild_id' not in {row[1] for row in self.db.execute("PRAGMA table_info(polls)")}:
+            # Databases from before polls were split by shard
+            self.db.execute("ALTER TABLE polls ADD COLUMN guild_id INTEGER")
+        self.db.commit()
+        rows = self.db.execute(
+            "SELECT message_id, channel_id, question, options, counts, closes_at, guild_id FROM polls WHERE closed = 0"
+        ).fetchall()
+        rows = [row for row in rows if owns_guild(bot, row[6])]
+        now = time.time()
+        for message_id, channel_id, question, options, counts, closes_at, guild_id in rows:
+            message = bot.get_partial_messageable(channel_id).get_partial_message(message_id)
+            session = PollSession(message, question, json.loads(options), json.loads(counts), closes_at, guild_id)
+            self.open(message_id, session, max(0.0, closes_at - now))
+        if rows:
+            logger.info(f"Reopened {len(rows)} open polls")
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        # Save tallies; live edits stop with the bot
+        polls = [session for session in self.dirty if session.persistent]
+        self.dirty.clear()
+        await asyncio.to_thread(self._save, polls)
+        await asyncio.to_thread(self._close)
+
+    def _close(self):
+        with self.save_lock:
+            self.db.close()
+            self.db = None
+
+    async def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            await asyncio.sleep(self.wheel.tick)
+            for message_id in self.wheel.advance():
+                session = self.sessions.pop(message_id, None)
+                if session is not None:
+                    session.on_expire(self)
+            if self.dirty and time.monotonic() - last_flush >= self.edit_interval:
+                last_flush = time.monotonic()
+                try:
+                    await self._flush()
+                except Exception as e:
+                    logger.warning(f"Session flush failed: {e}")
+
+    async def _flush(self):
+        polls = [session for session in self.dirty if session.persistent]
+        self.dirty.clear()
+        for poll in polls:
+            self.spawn(self._edit(poll))
+        await asyncio.to_thread(self._save, polls)
+
+    async def _edit(self, poll):
+        try:
+            await poll.message.edit(embed=poll.render())
+        except discord.HTTPException as e:
+            logger.warning(f"Could not update poll {poll.message.id}: {e}")
+
+    def _save(self, polls):
+        with self.save_lock, self.db:
+            self.db.executemany(
+                "INSERT INTO polls (message_id, channel_id, question, options, counts, closes_at, closed, guild_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (message_id) DO UPDATE SET "
+                "counts = excluded.counts, closed = excluded.closed",
+                [
+                    (poll.message.id, poll.message.channel.id, poll.question, json.dumps(poll.options),
+                     json.dumps(poll.counts), poll.closes_at, int(poll.closed), poll.guild_id)
+                    for poll in polls
+                ]
+            )
+
+
+# Shared registry. Polls are kept in SESSIONS_DB_PATH (the stats database by default)
+# and close after POLL_DURATION seconds; riddle answers can be asked for for RIDDLE_DURATION.
+session_registry = SessionRegistry(os.getenv('SESSIONS_DB_PATH', os.getenv('STATS_DB_PATH', 'stats.db')))
+POLL_DURATION = float(os.getenv('POLL_DURATION', '86400'))
+RIDDLE_DURATION = float(os.getenv('RIDDLE_DURATION', '30'))
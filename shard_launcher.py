@@ -0,0 +1,265 @@
+"""
+Run bot_simple.py as several processes, each owning a range of gateway shards
+
+The supervisor splits SHARD_COUNT shards (or Discord's recommendation) over
+SHARD_PROCESSES worker processes. Each worker runs the normal bot as an
+AutoShardedBot limited to its shard ids. Workers are started a few seconds
+apart so their shards don't all identify at once. A worker that exits is
+restarted with exponential backoff, and one that stops sending heartbeats
+is killed and restarted. Every REPORT_INTERVAL seconds the supervisor logs
+each shard's gateway latency and its process's event-loop lag.
+
+State every shard needs to see goes into SQLite files under SHARD_STATE_DIR,
+unless the path is already set:
+- stats (STATS_DB_PATH)
+- the AI response cache (AI_CACHE_PATH)
+- user rate limits (RATE_LIMIT_SHARED_PATH)
+Polls, token usage and guild or channel rate limits are per guild, and a
+guild always lives on the same shard.
+
+Usage:
+    SHARD_COUNT=4 SHARD_PROCESSES=2 python shard_launcher.py
+"""
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import time
+import urllib.request
+
+from bot_logging import setup_logging
+
+logger = logging.getLogger('shard_launcher')
+
+# Discord lets a bot identify one shard per five seconds (per max_concurrency bucket)
+IDENTIFY_INTERVAL = 5.0
+
+
+def recommended_shards(token):
+    """Discord's recommended shard count for this bot"""
+    request = urllib.request.Request(
+        'https://discord.com/api/v10/gateway/bot', headers={'Authorization': f'Bot {token}'}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)['shards']
+
+
+def shard_ranges(shard_count, processes):
+    """Split shard ids 0..shard_count-1 into ``processes`` contiguous, near-equal ranges"""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+def run_worker(index, environment, heartbeats):
+    """Worker process entry point: run the bot on this worker's shards"""
+    # Stop like on Ctrl-C, so stats, usage and polls are written out
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    # bot_simple reads its settings at import time
+    os.environ.update(environment)
+    import asyncio
+    import bot_simple
+
+    def heartbeat(status):
+        heartbeats.put_nowait((index, status))
+
+    try:
+        asyncio.run(bot_simple.serve(os.environ['DISCORD_BOT_TOKEN'], heartbeat))
+    except KeyboardInterrupt:
+        pass
+
+
+class Worker:
+    """One worker process slot: its shards, the current process and its restart state"""
+
+    def __init__(self, index, shard_ids, environment):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.environment = environment
+        self.process = None
+        self.started_at = 0.0
+        self.next_start = 0.0
+        self.backoff = 0.0
+        self.restarts = 0
+        self.last_heartbeat = 0.0
+        self.status = None
+
+
+class ShardSupervisor:
+    """Starts, watches and restarts the worker processes"""
+
+    def __init__(self, shard_count, ranges, base_environment, heartbeat_timeout=90.0, report_interval=60.0,
+                 min_backoff=1.0, max_backoff=60.0, stable_after=300.0):
+        """
+        Args:
+            shard_count: Total shards across every process
+            ranges: Shard ids per worker process
+            base_environment: Environment every worker gets (on top of ours)
+            heartbeat_timeout: Seconds without a heartbeat (or since start,
+                before the first one) before a worker counts as hung
+            report_interval: Seconds between per-shard status logs
+            min_backoff, max_backoff: Restart delay bounds, doubling per crash
+            stable_after: Seconds a worker has to stay up for its backoff to reset
+        """
+        self.context = multiprocessing.get_context('spawn')
+        self.heartbeats = self.context.Queue()
+        self.heartbeat_timeout = heartbeat_timeout
+        self.report_interval = report_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.stopping = False
+        self.workers = []
+        metrics_port = int(base_environment.get('METRICS_PORT', '0'))
+        rate_limit_state = base_environment.get('RATE_LIMIT_STATE', os.getenv('RATE_LIMIT_STATE'))
+        now, shards_before = time.monotonic(), 0
+        for index, shard_ids in enumerate(ranges):
+            environment = dict(
+                base_environment,
+                SHARD_COUNT=str(shard_count),
+                SHARD_IDS=','.join(map(str, shard_ids)),
+                # One /metrics port per process
+                METRICS_PORT=str(metrics_port + index if metrics_port else 0)
+            )
+            if rate_limit_state:
+                # Per-process snapshot of the in-memory (guild and channel) buckets
+                environment['RATE_LIMIT_STATE'] = f"{rate_limit_state}.{index}"
+            worker = Worker(index, shard_ids, environment)
+            worker.next_start = now + shards_before * IDENTIFY_INTERVAL
+            shards_before += len(shard_ids)
+            self.workers.append(worker)
+
+    def start(self, worker):
+        worker.process = self.context.Process(
+            target=run_worker, args=(worker.index, worker.environment, self.heartbeats),
+            name=f"shards-{worker.shard_ids[0]}-{worker.shard_ids[-1]}"
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        worker.last_heartbeat = 0.0
+        worker.status = None
+        logger.info(f"Started worker {worker.index} (pid {worker.process.pid}) for shards {worker.shard_ids}")
+
+    def schedule_restart(self, worker, reason):
+        now = time.monotonic()
+        if now - worker.started_at >= self.stable_after:
+            worker.backoff = 0.0
+        worker.backoff = min(self.max_backoff, max(self.min_backoff, worker.backoff * 2))
+        worker.next_start = now + worker.backoff
+        worker.restarts += 1
+        worker.process = None
+        logger.warning(
+            f"Worker {worker.index} (shards {worker.shard_ids}) {reason}; restarting in {worker.backoff:g}s"
+        )
+
+    def check(self, now):
+        for worker in self.workers:
+            if worker.process is None:
+                if now >= worker.next_start:
+                    self.start(worker)
+            elif worker.process.exitcode is not None:
+                self.schedule_restart(worker, f"exited with code {worker.process.exitcode}")
+            elif now - (worker.last_heartbeat or worker.started_at) > self.heartbeat_timeout:
+                silent = now - (worker.last_heartbeat or worker.started_at)
+                worker.process.kill()
+                worker.process.join(5)
+                self.schedule_restart(worker, f"sent no heartbeat for {silent:.0f}s")
+
+    def report(self):
+        for worker in self.workers:
+            status = worker.status
+            if status is None:
+                logger.info(f"Worker {worker.index} shards {worker.shard_ids}: no heartbeat yet "
+                            f"({worker.restarts} restarts)")
+                continue
+            lag = status['loop_lag']
+            for shard_id in worker.shard_ids:
+                latency = status['latencies'].get(shard_id)
+                logger.info(
+                    f"Shard {shard_id} (worker {worker.index}, pid {status['pid']}): "
+                    f"gateway {f'{latency * 1000:.0f}ms' if latency is not None else 'not connected'} | "
+                    f"loop lag p50 {lag['p50'] * 1000:.1f}ms / p99 {lag['p99'] * 1000:.1f}ms / "
+                    f"max {lag['max'] * 1000:.1f}ms | {status['guilds']} guilds | {worker.restarts} restarts"
+                )
+
+    def run(self):
+        """Supervise until SIGINT/SIGTERM, then stop every worker"""
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, 'stopping', True))
+        last_report = time.monotonic()
+        try:
+            while not self.stopping:
+                try:
+                    index, status = self.heartbeats.get(timeout=1.0)
+                    worker = self.workers[index]
+                    worker.status = status
+                    worker.last_heartbeat = time.monotonic()
+                except queue.Empty:
+                    pass
+                now = time.monotonic()
+                self.check(now)
+                if now - last_report >= self.report_interval:
+                    last_report = now
+                    self.report()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        logger.info("Stopping shard workers")
+        running = [worker.process for worker in self.workers if worker.process is not None]
+        for process in running:
+            process.terminate()
+        for process in running:
+            process.join(15)
+            if process.exitcode is None:
+                process.kill()
+
+
+def shared_state_environment(state_dir):
+    """Defaults putting the state all shards share in SQLite files under ``state_dir``"""
+    os.makedirs(state_dir, exist_ok=True)
+    defaults = {
+        'STATS_DB_PATH': os.path.join(state_dir, 'stats.db'),
+        'AI_CACHE_PATH': os.path.join(state_dir, 'ai_cache.db'),
+        'RATE_LIMIT_SHARED_PATH': os.path.join(state_dir, 'rate_limits.db'),
+        # Global leaderboards take other processes' writes into account this often
+        'STATS_GLOBAL_REFRESH': '60'
+    }
+    return {name: value for name, value in defaults.items() if not os.getenv(name)}
+
+
+def main():
+    setup_logging()
+    token = os.getenv('DISCORD_BOT_TOKEN')
+    if not token:
+        logger.error("DISCORD_BOT_TOKEN not found")
+        sys.exit(1)
+
+    shard_count = os.getenv('SHARD_COUNT', 'auto')
+    shard_count = recommended_shards(token) if shard_count == 'auto' else int(shard_count)
+    processes = int(os.getenv('SHARD_PROCESSES', str(os.cpu_count() or 1)))
+    ranges = shard_ranges(shard_count, processes)
+    logger.info(f"Running {shard_count} shards in {len(ranges)} processes: {ranges}")
+
+    supervisor = ShardSupervisor(
+        shard_count, ranges,
+        shared_state_environment(os.getenv('SHARD_STATE_DIR', 'shared_state')) | {
+            'METRICS_PORT': os.getenv('METRICS_PORT', '9090')
+        },
+        heartbeat_timeout=float(os.getenv('SHARD_HEARTBEAT_TIMEOUT', '90')),
+        report_interval=float(os.getenv('SHARD_REPORT_INTERVAL', '60'))
+    )
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Per-user counters, in column order
+METRICS = ('roasts_given', 'roasts_received', 'battles', 'battle_wins', 'commands')
+METRIC_INDEX = {metric: index for index, metric in enumerate(METRICS)}
+# Metrics with leaderboards
+RANKED = ('roasts_received', 'battle_wins', 'roasts_given')
+# Leaderboard scope for totals across every guild
+GLOBAL = 'global'
+
+_UPSERT_USER = (
+    f"INSERT INTO user_stats (guild_id, user_id, {', '.join(METRICS)}) "
+    f"VALUES (?, ?, {', '.join('?' * len(METRICS))}) "
+    f"ON CONFLICT (guild_id, user_id) DO UPDATE SET "
+    + ', '.join(f"{metric} = {metric} + excluded.{metric}" for metric in METRICS)
+)
+_UPSERT_GLOBAL = (
+    f"INSERT INTO global_stats (user_id, {', '.join(METRICS)}) "
+    f"VALUES (?, {', '.join('?' * len(METRICS))}) "
+    f"ON CONFLICT (user_id) DO UPDATE SET "
+    + ', '.join(f"{metric} = {metric} + excluded.{metric}" for metric in METRICS)
+)
+_UPSERT_COMMAND = (
+    "INSERT INTO command_usage (guild_id, command, uses) VALUES (?, ?, ?) "
+    "ON CONFLICT (guild_id, command) DO UPDATE SET uses = uses + excluded.uses"
+)
+
+
+class TopK:
+    """
+    The ``size`` highest scores, kept sorted as scores are updated
+
+    Counters only ever grow, so a user outside the top ``size`` can only get
+    in by an update that is seen here, and the kept list stays exact without
+    ever looking at the rest.
+    """
+
+    __slots__ = ('size', 'entries', 'scores')
+
+    def __init__(self, size, rows=()):
+        self.size = size
+        # (-score, user_id), best first; user_id -> score for the users in it
+        self.entries = []
+        self.scores = {}
+        for user_id, score in rows:
+            self.update(user_id, score)
+
+    def update(self, user_id, score):
+        """Record ``user_id``'s new total"""
+        old = self.scores.get(user_id)
+        if old is not None:
+            if score == old:
+                return
+            del self.entries[bisect_left(self.entries, (-old, user_id))]
+        elif score <= 0 or (len(self.entries) >= self.size and (-score, user_id) > self.entries[-1]):
+            return
+        insort(self.entries, (-score, user_id))
+        self.scores[user_id] = score
+        if len(self.entries) > self.size:
+            _, dropped = self.entries.pop()
+            del self.scores[dropped]
+
+    def top(self, limit):
+        """Best ``limit`` (user_id, score) pairs"""
+        return [(user_id, -score) for score, user_id in self.entries[:limit]]
+
+
+class StatsStore:
+    """
+    Per-guild, per-user event counters with write-behind to SQLite
+
+    Recording an event only bumps an in-memory counter. A background task
+    folds the pending counts into pre-aggregated tables every
+    ``flush_interval`` seconds, in one transaction on a worker thread.
+    Reads are primary-key or index lookups on a second (WAL reader)
+    connection, run on a worker thread, plus whatever is still pending or
+    being flushed, so they are current and never wait on the event loop.
+    DMs are counted under guild 0.
+
+    Leaderboards (per guild and :data:`GLOBAL`) are :class:`TopK` indexes,
+    seeded from the database the first time they are asked for and then
+    updated with the new totals of just the users each flush touched.
+    When several shard processes share the database, the global ones also
+    take other processes' writes, so they are re-read every
+    ``global_refresh`` seconds (guilds only ever live on one shard).
+    """
+
+    def __init__(self, path, flush_interval=10.0, top_size=25, max_rankings=1000, global_refresh=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.top_size = top_size
+        self.max_rankings = max_rankings
+        self.global_refresh = global_refresh
+        # (scope, metric) -> TopK, least recently asked for first
+        self.rankings = OrderedDict()
+        # metric -> event loop time its global TopK was read from the database
+        self.global_seeded = {}
+        # (guild_id, user_id) -> counts per METRICS; (guild_id, command) -> uses
+        self.pending = {}
+        self.pending_commands = {}
+        # The batch a flush is writing, numbered so reads can tell whether it has landed
+        self.flushing = {}
+        self.batches = 0
+        self.committed = 0
+        self.writer = None
+        self.reader = None
+        self.write_lock = threading.Lock()
+        # Held while a batch is between "taken from pending" and "committed"
+        self.flush_lock = asyncio.Lock()
+        self.task = None
+
+    def record(self, guild_id, user_id, metric, amount=1):
+        """Count ``amount`` of ``metric`` for a user (no I/O)"""
+        key = (guild_id or 0, user_id)
+        counts = self.pending.get(key)
+        if counts is None:
+            counts = self.pending[key] = [0] * len(METRICS)
+        counts[METRIC_INDEX[metric]] += amount
+
+    def record_command(self, guild_id, user_id, command):
+        """Count one use of ``command`` for the guild and the user (no I/O)"""
+        self.record(guild_id, user_id, 'commands')
+        key = (guild_id or 0, command)
+        self.pending_commands[key] = self.pending_commands.get(key, 0) + 1
+
+    def start(self):
+        """Open the database and start the write-behind task"""
+        if self.task is not None:
+            return
+        self.writer = sqlite3.connect(self.path, check_same_thread=False)
+        self.writer.execute("PRAGMA journal_mode=WAL")
+        self.writer.execute("PRAGMA synchronous=NORMAL")
+        self.writer.execute(
+            "CREATE TABLE IF NOT EXISTS user_stats (guild_id INTEGER NOT NULL, user_id INTEGER NOT NULL, "
+            + ', '.join(f"{metric} INTEGER NOT NULL DEFAULT 0" for metric in METRICS)
+            + ", PRIMARY KEY (guild_id, user_id)) WITHOUT ROWID"
+        )
+        for metric in ('roasts_given', 'roasts_received', 'battle_wins'):
+            self.writer.execute(f"CREATE INDEX IF NOT EXISTS user_stats_{metric} ON user_stats (guild_id, {metric} DESC)")
+        self.writer.execute(
+            "CREATE TABLE IF NOT EXISTS command_usage (guild_id INTEGER NOT NULL, command TEXT NOT NULL, "
+            "uses INTEGER NOT NULL, PRIMARY KEY (guild_id, command)) WITHOUT ROWID"
+        )
+        self.writer.execute(
+            "CREATE TABLE IF NOT EXISTS global_stats (user_id INTEGER PRIMARY KEY, "
+            + ', '.join(f"{metric} INTEGER NOT NULL DEFAULT 0" for metric in METRICS) + ")"
+        )
+        for metric in RANKED:
+            self.writer.execute(f"CREATE INDEX IF NOT EXISTS global_stats_{metric} ON global_stats ({metric} DESC)")
+        if self.writer.execute("SELECT NOT EXISTS (SELECT 1 FROM global_stats)").fetchone()[0]:
+            # Databases from before global totals were kept
+            self.writer.execute(
+                f"INSERT INTO global_stats (user_id, {', '.join(METRICS)}) "
+                f"SELECT user_id, {', '.join(f'SUM({metric})' for metric in METRICS)} FROM user_stats GROUP BY user_id"
+            )
+        self.writer.commit()
+        self.reader = sqlite3.connect(self.path, check_same_thread=False)
+        self.task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Stats store opened at {self.path} (flushing every {self.flush_interval:g}s)")
+
+    async def stop(self):
+        """Write out everything pending and close the database"""
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        await self.flush()
+        with self.write_lock:
+            self.reader.close()
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Stats flush failed, will retry: {e}")
+
+    async def flush(self):
+        """Fold pending counts into the database"""
+        if self.writer is None or not (self.pending or self.pending_commands):
+            return
+        async with self.flush_lock:
+            users, self.pending = self.pending, {}
+            used, self.pending_commands = self.pending_commands, {}
+            self.batches += 1
+            self.flushing = users
+            try:
+                totals = await asyncio.to_thread(self._write, users, used, self.batches)
+            except Exception:
+                self.flushing = {}
+                # The transaction was rolled back: put the batch back so nothing is lost
+                for (guild_id, user_id), counts in users.items():
+                    for metric, amount in zip(METRICS, counts):
+                        if amount:
+                            self.record(guild_id, user_id, metric, amount)
+                for key, uses in used.items():
+                    self.pending_commands[key] = self.pending_commands.get(key, 0) + uses
+                raise
+            self.flushing = {}
+            for scope, user_id, *scores in totals:
+                for metric, score in zip(RANKED, scores):
+                    ranking = self.rankings.get((scope, metric))
+                    if ranking is not None:
+                        ranking.update(user_id, score)
+
+    def _write(self, users, used, batch):
+        """Apply a batch and return the new (scope, user_id, *RANKED totals) of every user in it"""
+        per_user = {}
+        for (_, user_id), counts in users.items():
+            total = per_user.setdefault(user_id, [0] * len(METRICS))
+            for index, amount in enumerate(counts):
+                total[index] += amount
+        ranked = ', '.join(RANKED)
+        totals = []
+        with self.write_lock:
+            with self.writer:
+                self.writer.executemany(_UPSERT_USER, [(*key, *counts) for key, counts in users.items()])
+                self.writer.executemany(_UPSERT_GLOBAL, [(user_id, *counts) for user_id, counts in per_user.items()])
+                self.writer.executemany(_UPSERT_COMMAND, [(*key, uses) for key, uses in used.items()])
+                for guild_id, user_id in users:
+                    row = self.writer.execute(
+                        f"SELECT {ranked} FROM user_stats WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+                    ).fetchone()
+                    totals.append((guild_id, user_id, *row))
+                for user_id in per_user:
+                    row = self.writer.execute(f"SELECT {ranked} FROM global_stats WHERE user_id = ?", (user_id,)).fetchone()
+                    totals.append((GLOBAL, user_id, *row))
+            self.committed = batch
+        return totals
+
+    async def user_stats(self, guild_id, user_id):
+        """
+        Counters for one user in one guild
+
+        Returns:
+            Dict of every metric in METRICS plus ``rank``: 1 + the number of
+            users in the guild with more roasts given
+        """
+        guild_id = guild_id or 0
+        if self.reader is None:
+            counts = list(self.pending.get((guild_id, user_id), [0] * len(METRICS)))
+            return dict(zip(METRICS, counts), rank=1)
+        key = (guild_id, user_id)
+        # Copies taken on the loop, so a flush starting meanwhile can't move counts out from under the read
+        pending = self.pending.get(key, ())
+        flushing = self.flushing.get(key, ())
+        return await asyncio.to_thread(self._read_user, guild_id, user_id, list(pending), list(flushing), self.batches)
+
+    def _read_user(self, guild_id, user_id, pending, flushing, batch):
+        # The write lock is only contended while a batch commits, and says whether this one has
+        with self.write_lock:
+            row = self.reader.execute(
+                f"SELECT {', '.join(METRICS)} FROM user_stats WHERE guild_id = ? AND user_id = ?",
+                (guild_id, user_id)
+            ).fetchone()
+            counts = list(row or [0] * len(METRICS))
+            extra = (pending, flushing) if self.committed < batch else (pending,)
+            for amounts in extra:
+                for index, amount in enumerate(amounts):
+                    counts[index] += amount
+            result = dict(zip(METRICS, counts))
+            ahead = self.reader.execute(
+                "SELECT COUNT(*) FROM user_stats WHERE guild_id = ? AND roasts_given > ?",
+                (guild_id, result['roasts_given'])
+            ).fetchone()[0]
+        result['rank'] = ahead + 1
+        return result
+
+    async def leaderboard(self, scope, metric='roasts_given', limit=10):
+        """
+        Top ``limit`` (user_id, count) pairs for ``metric``, as of the last flush
+
+        Args:
+            scope: Guild id (None for DMs) or :data:`GLOBAL`
+            metric: One of RANKED
+            limit: At most ``top_size``
+        """
+        if metric not in RANKED:
+            raise ValueError(f"Unknown leaderboard {metric!r}")
+        if self.reader is None:
+            return []
+        scope = scope if scope == GLOBAL else scope or 0
+        key = (scope, metric)
+        ranking = self.rankings.get(key)
+        now = asyncio.get_running_loop().time()
+        if ranking is not None and scope == GLOBAL and self.global_refresh:
+            if now - self.global_seeded.get(metric, now) >= self.global_refresh:
+                ranking = None
+        if ranking is None:
+            # Seeding waits out a flush in progress, so its totals aren't applied to a stale list
+            async with self.flush_lock:
+                rows = await asyncio.to_thread(self._read_top, scope, metric)
+                ranking = self.rankings[key] = TopK(self.top_size, rows)
+                if scope == GLOBAL:
+                    self.global_seeded[metric] = now
+                if len(self.rankings) > self.max_rankings:
+                    self.rankings.popitem(last=False)
+        else:
+            self.rankings.move_to_end(key)
+        return ranking.top(limit)
+
+    def _read_top(self, scope, metric):
+        with self.write_lock:
+            if scope == GLOBAL:
+                return self.reader.execute(
+                    f"SELECT user_id, {metric} FROM global_stats WHERE {metric} > 0 ORDER BY {metric} DESC LIMIT ?",
+                    (self.top_size,)
+                ).fetchall()
+            return self.reader.execute(
+                f"SELECT user_id, {metric} FROM user_stats WHERE guild_id = ? AND {metric} > 0 "
+                f"ORDER BY {metric} DESC LIMIT ?",
+                (scope, self.top_size)
+            ).fetchall()
+
+
+# Shared store. STATS_DB_PATH is the SQLite file (put it on a volume to keep stats across
+# deploys); STATS_FLUSH_INTERVAL is how often pending counts are written, in seconds.
+# STATS_GLOBAL_REFRESH (seconds, 0 = never) re-reads global leaderboards other shard processes write to.
+roast_stats = StatsStore(
+    os.getenv('STATS_DB_PATH', 'stats.db'),
+    flush_interval=float(os.getenv('STATS_FLUSH_INTERVAL', '10')),
+    global_refresh=float(os.getenv('STATS_GLOBAL_REFRESH', '0')) or None
+)